@@ -1,19 +1,40 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response
 from flask_cors import CORS
 import os
+import logging
 from audio_transcript import transcribe_audio
 from video_to_audio import convert_video_to_audio
+from vad import strip_silence, vad_enabled
 from summarize import generate_summary
 from llm_integration import generate_notes
 from cache_manager import cache_manager
 from chat_service import chat_service
+from metrics import render, span, jobs_in_progress, record_cache_lookup, start_memory_sampler, CONTENT_TYPE
+from model_manager import model_manager
 import json
+import math
 import time
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Configure leveled logging (set LOG_LEVEL=DEBUG to log full transcripts and notes)
+logging.basicConfig(
+    level=os.environ.get("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+)
+logger = logging.getLogger(__name__)
 
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)
 
+# Every worker keeps its own memory gauge current, not just the one that serves /metrics
+start_memory_sampler()
+
 # Define Upload & Output Folders
 UPLOAD_FOLDER = "uploads"
 OUTPUT_FOLDER = "outputs"
@@ -25,11 +46,67 @@ os.makedirs(CACHE_FOLDER, exist_ok=True)
 # Set the default port
 PORT = int(os.environ.get("PORT", 5004))
 
+# Responses smaller than this are not worth compressing
+COMPRESSION_MIN_BYTES = 1024
+# Upper bound on segments returned per page of GET /upload
+MAX_SEGMENT_PAGE = 500
+
+def negotiate_encoding():
+    """Pick br or gzip from the request's Accept-Encoding, or None if neither is accepted."""
+    if brotli is not None and request.accept_encodings["br"]:
+        return "br"
+    if request.accept_encodings["gzip"]:
+        return "gzip"
+    return None
+
+def compressed_response(body: bytes, status: int = 200, mimetype: str = "application/json") -> Response:
+    """Build a response compressed with br or gzip, whichever the client accepts."""
+    response = Response(body, status=status, mimetype=mimetype)
+    response.vary.add("Accept-Encoding")
+    if len(body) < COMPRESSION_MIN_BYTES:
+        return response
+
+    encoding = negotiate_encoding()
+    if encoding == "br":
+        response.set_data(brotli.compress(body, quality=5))
+        response.headers["Content-Encoding"] = "br"
+    elif encoding == "gzip":
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+def parse_number_arg(name: str):
+    """Parse a finite numeric query argument, or return None if it is absent."""
+    value = request.args.get(name)
+    if value is None:
+        return None
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"{name} must be finite")
+    return number
+
+def parse_list_arg(name: str):
+    """Split a comma-separated query argument, or return None if it is absent."""
+    value = request.args.get(name)
+    if value is None:
+        return None
+    return [item.strip() for item in value.split(",") if item.strip()]
+
 @app.route("/health", methods=["GET"])
 def health_check():
     """Health check endpoint to verify server status."""
     return jsonify({"status": "running"}), 200
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Expose pipeline timings, cache counters and memory gauges in Prometheus text format."""
+    return Response(render(), content_type=CONTENT_TYPE)
+
+@app.route("/models", methods=["GET"])
+def models():
+    """Report the model memory budget and which models are loaded, pinned or idle."""
+    return jsonify(model_manager.state()), 200
+
 @app.route("/upload", methods=["POST"])
 def upload_video():
     """Handles video upload, conversion to audio, transcription, summarization, and note generation."""
@@ -44,6 +121,7 @@ def upload_video():
     audio_output = os.path.join(OUTPUT_FOLDER, f"{os.path.splitext(file.filename)[0]}.mp3")
     status_file = f"{audio_output}.status"
 
+    jobs_in_progress.inc()
     try:
         # Save the uploaded video
         file.save(video_path)
@@ -51,11 +129,12 @@ def upload_video():
         # Check if we have cached results
         cached_result = cache_manager.get_cached_result(video_path)
         if cached_result:
-            print("Using cached result for", file.filename)
+            logger.info("Using cached result for %s", file.filename)
             return jsonify(cached_result), 200
 
         # Start the conversion process
-        convert_video_to_audio(video_path, audio_output)
+        with span("conversion"):
+            convert_video_to_audio(video_path, audio_output)
         
         # Wait for the status file to be created
         while not os.path.exists(status_file):
@@ -68,18 +147,38 @@ def upload_video():
         if status["status"] == "error":
             return jsonify({"error": status["error"]}), 500
             
+        # Strip long silences so Whisper only processes speech
+        speech = None
+        if vad_enabled():
+            with span("vad"):
+                speech = strip_silence(audio_output)
+        removed_duration = speech["removed_duration"] if speech else 0
+        with open(status_file, 'w') as f:
+            json.dump({
+                "status": "transcribing",
+                "progress": 0,
+                "error": None,
+                "removed_duration": removed_duration
+            }, f)
+            
         # Process the video if not cached
-        transcript = transcribe_audio(audio_output)  # Transcribe audio
-        print('Transcript:', transcript["text"])
+        with span("transcription"):
+            transcript = transcribe_audio(audio_output, speech)  # Transcribe audio
+            if "error" in transcript:
+                # transcribe_audio reports failures instead of raising; fail the stage here
+                raise RuntimeError(f"Transcription failed: {transcript['error']}")
+        logger.info("Transcribed %s (%d characters)", file.filename, len(transcript["text"]))
+        logger.debug("Transcript: %s", transcript["text"])
         
         title = os.path.splitext(file.filename)[0]
-        print('Title:', title)
         
-        summary = generate_summary(title, transcript["text"])  # Generate summary
-        print('\n\n\nSummary:', summary)
+        with span("summarization"):
+            summary = generate_summary(title, transcript["text"])  # Generate summary
+        logger.debug("Summary: %s", summary)
         
-        notes = generate_notes(f'Summary: {summary} \n\n\nNotes:\n{transcript["text"]}')  # Generate structured notes
-        print('Notes:', notes)
+        with span("notes"):
+            notes = generate_notes(f'Summary: {summary} \n\n\nNotes:\n{transcript["text"]}')  # Generate structured notes
+        logger.debug("Notes: %s", notes)
 
         # Prepare result
         result = {
@@ -90,6 +189,12 @@ def upload_video():
             "notes": notes,
             "status": "completed"
         }
+        if speech:
+            result["vad"] = {
+                "original_duration": speech["original_duration"],
+                "speech_duration": speech["speech_duration"],
+                "removed_duration": speech["removed_duration"]
+            }
 
         # Cache the result
         cache_manager.cache_result(video_path, result)
@@ -97,7 +202,10 @@ def upload_video():
         return jsonify(result), 200
 
     except Exception as e:
+        logger.exception("Processing failed for %s", file.filename)
         return jsonify({"error": f"Processing failed: {str(e)}"}), 500
+    finally:
+        jobs_in_progress.dec()
 
 @app.route("/status/<filename>", methods=["GET"])
 def get_status(filename):
@@ -112,12 +220,13 @@ def get_status(filename):
             }), 404
 
         # Check if we have cached results (processing completed)
-        cached_result = cache_manager.get_cached_result(video_path)
-        if cached_result:
+        cached_result = cache_manager.get_cached_fields(video_path, ["vad"])
+        if cached_result is not None:
             return jsonify({
                 "status": "completed",
                 "progress": 100,
-                "step": "completed"
+                "step": "completed",
+                "removed_duration": cached_result.get("vad", {}).get("removed_duration", 0)
             })
 
         # Check status file for current processing state
@@ -139,7 +248,8 @@ def get_status(filename):
                     "status": status["status"],
                     "progress": status.get("progress", 0),
                     "step": step,
-                    "error": status.get("error")
+                    "error": status.get("error"),
+                    "removed_duration": status.get("removed_duration", 0)
                 })
 
         # If we have the video but no status file, processing hasn't started
@@ -168,7 +278,15 @@ def serve_video(filename):
 
 @app.route("/upload", methods=["GET"])
 def get_processed_data():
-    """Get the processed data for a given filename."""
+    """
+    Get the processed data for a given filename.
+
+    Optional query arguments:
+        fields: Comma-separated fields to return, e.g. summary,notes or transcript.text
+        start, end: Return transcript segments overlapping this time range (seconds)
+        offset, limit: Page through the matching segments
+        segment_fields: Comma-separated keys to keep per segment, e.g. start,end,text
+    """
     try:
         filename = request.args.get("filename")
         if not filename:
@@ -178,12 +296,43 @@ def get_processed_data():
         if not os.path.exists(video_path):
             return jsonify({"error": "Video not found"}), 404
 
-        # Get cached result
-        cached_result = cache_manager.get_cached_result(video_path)
-        if cached_result:
-            return jsonify(cached_result), 200
+        fields = parse_list_arg("fields")
+        segment_fields = parse_list_arg("segment_fields")
+        try:
+            start = parse_number_arg("start")
+            end = parse_number_arg("end")
+            offset = max(0, int(request.args.get("offset", 0)))
+            limit = min(MAX_SEGMENT_PAGE, max(0, int(request.args.get("limit", MAX_SEGMENT_PAGE))))
+        except ValueError:
+            return jsonify({"error": "start, end, offset and limit must be numbers"}), 400
+
+        cache_file_path = cache_manager.get_cache_file_path(video_path)
+        record_cache_lookup("result", hit=cache_file_path is not None)
+        if not cache_file_path:
+            return jsonify({"error": "No processed data found"}), 404
+
+        paginate = any(name in request.args for name in ("start", "end", "offset", "limit", "segment_fields"))
+        if fields is None and not paginate:
+            # Serve the whole cached result without parsing it, streamed when not compressed
+            if negotiate_encoding() is None:
+                response = send_file(cache_file_path, mimetype="application/json")
+                response.vary.add("Accept-Encoding")
+                return response
+            with open(cache_file_path, 'rb') as f:
+                return compressed_response(f.read())
+
+        fields = fields or []
+        result = cache_manager.get_cached_fields(video_path, [field for field in fields if field != "segments"])
+        if result is None:
+            return jsonify({"error": "No processed data found"}), 404
+
+        if paginate or "segments" in fields:
+            result["segments"] = cache_manager.get_cached_segments(
+                video_path, start=start, end=end, offset=offset, limit=limit,
+                segment_fields=segment_fields
+            )
 
-        return jsonify({"error": "No processed data found"}), 404
+        return compressed_response(json.dumps(result).encode())
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -235,5 +384,5 @@ def delete_text():
         return jsonify({"error": str(e)}), 500
 
 if __name__ == "__main__":
-    print(f"🚀 Server running on http://127.0.0.1:{PORT}")
+    logger.info("🚀 Server running on http://127.0.0.1:%d", PORT)
     app.run(host="0.0.0.0", port=PORT, debug=True)
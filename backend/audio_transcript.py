@@ -1,22 +1,43 @@
 import whisper
 import os
 import json
+import logging
+from model_manager import model_manager, whisper_unload_when_idle
+from vad import remap_segments
 
-def transcribe_audio(audio_path):
-    """Transcribe audio file using Whisper"""
+logger = logging.getLogger(__name__)
+
+# Whisper is loaded on first use. Uploads are rare next to questions, so by default
+# it is unloaded after each transcription instead of staying resident in every worker
+model_manager.register(
+    "whisper-base", lambda: whisper.load_model("base"),
+    unload_when_idle=whisper_unload_when_idle()
+)
+
+def transcribe_audio(audio_path, speech=None):
+    """
+    Transcribe audio file using Whisper
+
+    If `speech` (the output of vad.strip_silence) is given, only the speech-only
+    waveform is transcribed and segment timestamps are mapped back onto the
+    original recording.
+    """
     try:
-        # Load the Whisper model
-        model = whisper.load_model("base")
-        
-        # Transcribe the audio
-        result = model.transcribe(audio_path)
+        # Transcribe the audio with the Whisper model pinned
+        with model_manager.use("whisper-base") as model:
+            if speech is None:
+                result = model.transcribe(audio_path)
+            else:
+                result = model.transcribe(speech["audio"])
+        if speech is not None:
+            remap_segments(result["segments"], speech["offsets"])
         
         return {
             "text": result["text"],
             "segments": result["segments"]
         }
     except Exception as e:
-        print(f"Error in transcription: {str(e)}")
+        logger.exception("Error in transcription")
         return {"error": str(e)}
 
 def transcribe_audio_timestamped(audio_path):
@@ -0,0 +1,589 @@
+"""
+Per-stage benchmark harness for the Study Buddy backend.
+
+Every stage runs in its own fresh process against offline fixtures, so the
+numbers include model loading the way the server sees it and the peak RSS
+reported for a stage is not polluted by models loaded for another stage.
+
+Fixtures:
+    - a synthetic lecture video generated with FFmpeg (test pattern plus a
+      gated tone, i.e. "speech" bursts separated by silence)
+    - the reinforcement-learning transcript embedded in summarize.py
+    - stubbed OpenAI and Hugging Face Hub inference endpoints
+
+Model weights (Whisper, T5, MiniLM, instructor) and NLTK data are not
+stubbed. Stages run with HF_HUB_OFFLINE/TRANSFORMERS_OFFLINE set, so they
+must already be in the local caches: run once with --prefetch (which needs
+network access) to download them. summarize.py still calls nltk.download
+at import, which only logs an error when offline.
+
+Usage:
+    python benchmark.py --prefetch --output results.json  # first run, downloads models
+    python benchmark.py --output results.json
+    python benchmark.py --stages summarization,chat_qa --iterations 10
+    python benchmark.py --baseline results.json  # compare against an earlier run
+    python benchmark.py --backend int8 --compare-backends  # int8 vs fp32 accuracy/latency
+"""
+import argparse
+import ast
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from types import SimpleNamespace
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+STAGES = [
+    "conversion",
+    "vad",
+    "transcription",
+    "summarization",
+    "notes",
+    "chat_index",
+    "chat_qa",
+]
+
+STUB_NOTES = "# Lecture Notes\n\n## Summary\n- Stubbed notes generated by the benchmark harness."
+STUB_ANSWER = "Stubbed answer generated by the benchmark harness."
+# Keep Hugging Face libraries from reaching the network while timing
+OFFLINE_ENV = {"HF_HUB_OFFLINE": "1", "TRANSFORMERS_OFFLINE": "1"}
+QUESTIONS = [
+    "What is reinforcement learning?",
+    "What is the difference between model-based and model-free methods?",
+    "What is Q-learning?",
+    "How does policy iteration work?",
+]
+
+
+def load_lecture_fixture():
+    """Read the embedded lecture title and transcript from summarize.py without importing it"""
+    with open(os.path.join(BACKEND_DIR, "summarize.py"), "r") as f:
+        tree = ast.parse(f.read())
+
+    values = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1:
+            target = node.targets[0]
+            if isinstance(target, ast.Name) and target.id in ("title", "document"):
+                values[target.id] = ast.literal_eval(node.value)
+    return values["title"], values["document"].strip()
+
+
+def generate_synthetic_video(video_path: str, duration: float):
+    """Generate a small test video whose audio alternates 6s of tone with 4s of silence"""
+    cmd = [
+        'ffmpeg',
+        '-f', 'lavfi', '-i', f'testsrc=size=320x240:rate=10:duration={duration}',
+        '-f', 'lavfi', '-i', f"aevalsrc=0.5*sin(440*2*PI*t)*lt(mod(t\\,10)\\,6):s=16000:d={duration}",
+        '-c:v', 'mpeg4',
+        '-c:a', 'aac',
+        '-shortest',
+        '-y',
+        video_path
+    ]
+    subprocess.run(cmd, capture_output=True, check=True)
+
+
+def install_llm_stubs(latency: float):
+    """Replace the OpenAI and Hugging Face Hub endpoints with offline stubs"""
+    # Both modules read their keys at import time
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark-stub")
+    os.environ.setdefault("HUGGINGFACEHUB_API_TOKEN", "benchmark-stub")
+
+    import openai
+    from langchain_community.llms.fake import FakeListLLM
+
+    def fake_chat_completion(*args, **kwargs):
+        time.sleep(latency)
+        return SimpleNamespace(choices=[SimpleNamespace(message={"content": STUB_NOTES})])
+
+    openai.ChatCompletion.create = fake_chat_completion
+
+    import chat_service as chat_module
+    class SlowFakeListLLM(FakeListLLM):
+        """FakeListLLM only sleeps when streaming, so add the latency to every call"""
+        def _call(self, *args, **kwargs):
+            time.sleep(latency)
+            return super()._call(*args, **kwargs)
+
+    chat_module.HuggingFaceHub = lambda **kwargs: SlowFakeListLLM(responses=[STUB_ANSWER])
+
+
+def prefetch(config: dict):
+    """Download every checkpoint and NLTK resource the stages load, with network access"""
+    os.chdir(config["workdir"])
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ["INFERENCE_BACKEND"] = "fp32"
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark-stub")
+    os.environ.setdefault("HUGGINGFACEHUB_API_TOKEN", "benchmark-stub")
+
+    # Importing the pipeline modules fetches NLTK data and registers their models
+    import audio_transcript  # noqa: F401
+    import chat_service  # noqa: F401
+    import summarize  # noqa: F401
+    from model_manager import model_manager
+
+    for name in list(model_manager.loaders):
+        print(f"  fetching {name}", flush=True)
+        with model_manager.use(name):
+            pass
+
+
+def check_chat_result(result):
+    """ChatService reports failures as an (error, status) tuple instead of raising"""
+    if isinstance(result, tuple) or "error" in result:
+        raise RuntimeError(f"Chat service failed: {result}")
+    return result
+
+
+def build_stage(stage: str, config: dict) -> dict:
+    """
+    Prepare a stage for timing.
+
+    Returns:
+        dict: "run" is the timed callable, "before_each" an optional untimed
+        reset hook, and "work"/"unit" describe one iteration for throughput.
+    """
+    title, document = load_lecture_fixture()
+    words = len(document.split())
+    video_path = os.path.join("uploads", "benchmark_lecture.mp4")
+    audio_path = os.path.join("outputs", "benchmark_lecture.mp3")
+
+    if stage in ("conversion", "vad", "transcription"):
+        from video_to_audio import convert_video_to_audio
+        os.makedirs("uploads", exist_ok=True)
+        generate_synthetic_video(video_path, config["audio_seconds"])
+
+        if stage == "conversion":
+            return {
+                "run": lambda: convert_video_to_audio(video_path, audio_path),
+                "work": config["audio_seconds"],
+                "unit": "audio_s/s",
+            }
+
+        from vad import strip_silence, vad_enabled
+        convert_video_to_audio(video_path, audio_path)
+
+        if stage == "vad":
+            return {
+                "run": lambda: strip_silence(audio_path),
+                "work": config["audio_seconds"],
+                "unit": "audio_s/s",
+            }
+
+        # Transcribe what the server would: the speech-only audio when VAD is on
+        from audio_transcript import transcribe_audio
+        speech = strip_silence(audio_path) if vad_enabled() else None
+
+        def run_transcription():
+            result = transcribe_audio(audio_path, speech)
+            if "error" in result:
+                raise RuntimeError(f"Transcription failed: {result['error']}")
+
+        return {"run": run_transcription, "work": config["audio_seconds"], "unit": "audio_s/s"}
+
+    if stage == "summarization":
+        from summarize import generate_summary
+        return {
+            "run": lambda: generate_summary(title, document),
+            "work": words,
+            "unit": "words/s",
+        }
+
+    install_llm_stubs(config["llm_latency"])
+
+    if stage == "notes":
+        from llm_integration import generate_notes
+        return {
+            # Drop cached notes so every iteration reaches the (stubbed) endpoint
+            "before_each": lambda: shutil.rmtree(os.path.join("cache", "llm"), ignore_errors=True),
+            "run": lambda: generate_notes(f'Summary: {title} \n\n\nNotes:\n{document}'),
+            "work": 1,
+            "unit": "requests/s",
+        }
+
+    from chat_service import chat_service
+
+    if stage == "chat_index":
+        return {
+            # process_text re-registers the store, so every iteration embeds from scratch
+            "run": lambda: check_chat_result(chat_service.process_text("benchmark", document)),
+            "work": words,
+            "unit": "words/s",
+        }
+
+    if stage == "chat_qa":
+        check_chat_result(chat_service.process_text("benchmark", document))
+        questions = iter(QUESTIONS * (config["warmup"] + config["iterations"]))
+        return {
+            "run": lambda: check_chat_result(chat_service.ask_question("benchmark", next(questions))),
+            "work": 1,
+            "unit": "questions/s",
+        }
+
+    raise ValueError(f"Unknown stage: {stage}")
+
+
+def timed(function):
+    """Call a function and return its result with the elapsed wall time"""
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def timed_alternating(fp32_run, int8_run, runs: int):
+    """
+    Time the fp32 and int8 variants of a workload against each other.
+
+    Both are warmed up untimed first, then timed `runs` times each in
+    alternating order, so neither variant consistently runs first or cold.
+
+    Returns:
+        tuple: (fp32 output, int8 output, median fp32 seconds, median int8 seconds)
+    """
+    outputs = {"fp32": fp32_run(), "int8": int8_run()}
+    variants = {"fp32": fp32_run, "int8": int8_run}
+    durations = {"fp32": [], "int8": []}
+    for i in range(runs):
+        order = ["fp32", "int8"] if i % 2 == 0 else ["int8", "fp32"]
+        for name in order:
+            outputs[name], elapsed = timed(variants[name])
+            durations[name].append(elapsed)
+    return (outputs["fp32"], outputs["int8"],
+            percentile(durations["fp32"], 50), percentile(durations["int8"], 50))
+
+
+def token_f1(reference: str, candidate: str) -> float:
+    """Unigram F1 overlap between two generated texts"""
+    reference_tokens = reference.lower().split()
+    candidate_tokens = candidate.lower().split()
+    remaining = list(reference_tokens)
+    common = 0
+    for token in candidate_tokens:
+        if token in remaining:
+            remaining.remove(token)
+            common += 1
+    if common == 0:
+        return 0.0
+    precision = common / len(candidate_tokens)
+    recall = common / len(reference_tokens)
+    return 2 * precision * recall / (precision + recall)
+
+
+def compare_encoder(fp32_encode, int8_encode, queries, corpus, top_k: int, runs: int) -> dict:
+    """
+    Compare two encoder variants on embedding agreement, ranking agreement and latency.
+
+    Each encode callable takes (texts, is_query) so instruction-tuned encoders
+    can embed queries and documents differently.
+    """
+    import torch
+    from sentence_transformers import util
+
+    fp32_corpus, int8_corpus, fp32_time, int8_time = timed_alternating(
+        lambda: fp32_encode(corpus, False), lambda: int8_encode(corpus, False), runs
+    )
+    fp32_queries = fp32_encode(queries, True)
+    int8_queries = int8_encode(queries, True)
+
+    fp32_top = util.pytorch_cos_sim(fp32_queries, fp32_corpus).topk(top_k).indices.tolist()
+    int8_top = util.pytorch_cos_sim(int8_queries, int8_corpus).topk(top_k).indices.tolist()
+    overlap = [len(set(a) & set(b)) / top_k for a, b in zip(fp32_top, int8_top)]
+
+    return {
+        "fp32_s": fp32_time,
+        "int8_s": int8_time,
+        "speedup": fp32_time / int8_time,
+        "mean_cosine": torch.nn.functional.cosine_similarity(fp32_corpus, int8_corpus).mean().item(),
+        f"top{top_k}_overlap": sum(overlap) / len(overlap),
+    }
+
+
+def compare_backends(config: dict) -> dict:
+    """Measure accuracy and latency of the int8 backend against fp32 on the lecture fixture"""
+    os.chdir(config["workdir"])
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ.update(OFFLINE_ENV)
+
+    import copy
+    import nltk
+    from InstructorEmbedding import INSTRUCTOR
+    from sentence_transformers import SentenceTransformer, util
+    from transformers import T5ForConditionalGeneration, T5Tokenizer
+    from inference import optimize_model
+
+    nltk.download('punkt', quiet=True)
+    nltk.download('punkt_tab', quiet=True)
+    title, document = load_lecture_fixture()
+    sentences = nltk.sent_tokenize(document)
+    report = {}
+
+    # Sentence ranking encoder used by generate_summary
+    minilm = optimize_model(SentenceTransformer('all-MiniLM-L6-v2'), "fp32")
+    minilm_int8 = optimize_model(copy.deepcopy(minilm), "int8")
+    report["all-MiniLM-L6-v2"] = compare_encoder(
+        lambda texts, is_query: minilm.encode(texts, convert_to_tensor=True),
+        lambda texts, is_query: minilm_int8.encode(texts, convert_to_tensor=True),
+        [title], sentences, top_k=5, runs=config["compare_runs"]
+    )
+
+    # Retrieval encoder used by the chat service, with LangChain's default instructions
+    instructor = optimize_model(INSTRUCTOR('hkunlp/instructor-base'), "fp32")
+    instructor_int8 = optimize_model(copy.deepcopy(instructor), "int8")
+
+    def instruct(model):
+        def encode(texts, is_query):
+            instruction = ("Represent the question for retrieving supporting documents: "
+                           if is_query else "Represent the document for retrieval: ")
+            return model.encode([[instruction, text] for text in texts], convert_to_tensor=True)
+        return encode
+
+    report["instructor-base"] = compare_encoder(
+        instruct(instructor), instruct(instructor_int8), QUESTIONS, sentences, top_k=3,
+        runs=config["compare_runs"]
+    )
+
+    # Paraphrase and summary generation, greedy so the two backends are comparable
+    ranked = util.pytorch_cos_sim(
+        minilm.encode(title, convert_to_tensor=True), minilm.encode(sentences, convert_to_tensor=True)
+    )[0].topk(5).indices.tolist()
+    prompts = [f"paraphrase: {sentences[i].strip()}" for i in ranked]
+    prompts.append("summarize: " + " ".join(sentences[i] for i in ranked))
+
+    tokenizer = T5Tokenizer.from_pretrained('t5-small', legacy=False)
+    t5 = optimize_model(T5ForConditionalGeneration.from_pretrained('t5-small'), "fp32")
+    t5_int8 = optimize_model(copy.deepcopy(t5), "int8")
+
+    def generate(model):
+        outputs = []
+        for prompt in prompts:
+            input_ids = tokenizer.encode(prompt, return_tensors="pt", max_length=512, truncation=True)
+            generated = model.generate(input_ids, max_length=128, num_beams=1, do_sample=False)
+            outputs.append(tokenizer.decode(generated[0], skip_special_tokens=True).strip())
+        return outputs
+
+    fp32_outputs, int8_outputs, fp32_time, int8_time = timed_alternating(
+        lambda: generate(t5), lambda: generate(t5_int8), config["compare_runs"]
+    )
+    scores = [token_f1(a, b) for a, b in zip(fp32_outputs, int8_outputs)]
+    report["t5-small"] = {
+        "fp32_s": fp32_time,
+        "int8_s": int8_time,
+        "speedup": fp32_time / int8_time,
+        "token_f1": sum(scores) / len(scores),
+    }
+    return report
+
+
+def percentile(values, pct: float) -> float:
+    """Linear-interpolated percentile of a list of numbers"""
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of the current process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes elsewhere
+    if platform.system() == "Darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def run_stage(stage: str, config: dict) -> dict:
+    """Run a single stage inside a worker process and collect its statistics"""
+    os.chdir(config["workdir"])
+    sys.path.insert(0, BACKEND_DIR)
+    # Models are prepared at import time, so the backend must be chosen first
+    os.environ["INFERENCE_BACKEND"] = config["backend"]
+    os.environ.update(OFFLINE_ENV)
+
+    spec = build_stage(stage, config)
+    before_each = spec.get("before_each")
+
+    for _ in range(config["warmup"]):
+        if before_each:
+            before_each()
+        spec["run"]()
+
+    durations = []
+    for _ in range(config["iterations"]):
+        if before_each:
+            before_each()
+        start = time.perf_counter()
+        spec["run"]()
+        durations.append(time.perf_counter() - start)
+
+    mean = sum(durations) / len(durations)
+    return {
+        "iterations": len(durations),
+        "p50_s": percentile(durations, 50),
+        "p95_s": percentile(durations, 95),
+        "mean_s": mean,
+        "min_s": min(durations),
+        "max_s": max(durations),
+        "throughput": spec["work"] / mean if mean > 0 else None,
+        "throughput_unit": spec["unit"],
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def git_revision() -> dict:
+    """Commit hash and dirty flag of the working tree, if available"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ['git', 'status', '--porcelain'], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (subprocess.SubprocessError, FileNotFoundError):
+        return {"commit": None, "dirty": None}
+
+
+def compare_with_baseline(results: dict, baseline: dict, threshold: float) -> list:
+    """Print p50 deltas against a baseline run and return the regressed stages"""
+    regressions = []
+    print(f"\nComparison with baseline {baseline.get('git', {}).get('commit')}:")
+    for stage, current in results["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if not previous or "error" in current or "error" in previous:
+            continue
+        delta = (current["p50_s"] - previous["p50_s"]) / previous["p50_s"]
+        flag = ""
+        if delta > threshold:
+            flag = "  REGRESSION"
+            regressions.append(stage)
+        print(f"  {stage:<15} {previous['p50_s']:.3f}s -> {current['p50_s']:.3f}s ({delta:+.1%}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark each Study Buddy pipeline stage")
+    parser.add_argument("--stages", default=",".join(STAGES),
+                        help="Comma-separated list of stages to run")
+    parser.add_argument("--iterations", type=int, default=5, help="Timed iterations per stage")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed warmup iterations per stage")
+    parser.add_argument("--audio-seconds", type=float, default=60.0,
+                        help="Duration of the synthetic lecture video")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0,
+                        help="Artificial latency added to each stubbed LLM call")
+    parser.add_argument("--backend", default=os.environ.get("INFERENCE_BACKEND", "fp32"),
+                        choices=["fp32", "int8"], help="Inference backend for the local models")
+    parser.add_argument("--compare-backends", action="store_true",
+                        help="Also compare int8 against fp32 accuracy and latency per model")
+    parser.add_argument("--compare-runs", type=int, default=5,
+                        help="Timed runs per backend in --compare-backends; the median is reported")
+    parser.add_argument("--prefetch", action="store_true",
+                        help="Download model checkpoints and NLTK data before running (needs network)")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON results")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    parser.add_argument("--regression-threshold", type=float, default=0.10,
+                        help="Relative p50 slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(unknown)}")
+    if args.iterations < 1:
+        parser.error("--iterations must be at least 1")
+    if args.compare_runs < 1:
+        parser.error("--compare-runs must be at least 1")
+
+    workdir = tempfile.mkdtemp(prefix="studybuddy-bench-")
+    config = {
+        "workdir": workdir,
+        "iterations": args.iterations,
+        "warmup": args.warmup,
+        "audio_seconds": args.audio_seconds,
+        "llm_latency": args.llm_latency_ms / 1000,
+        "backend": args.backend,
+        "compare_runs": args.compare_runs,
+    }
+
+    results = {
+        "schema": 1,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {key: value for key, value in config.items() if key != "workdir"},
+        "stages": {},
+    }
+
+    try:
+        if args.prefetch:
+            print("Prefetching models...", flush=True)
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                executor.submit(prefetch, config).result()
+
+        for stage in stages:
+            print(f"Running {stage}...", flush=True)
+            # A fresh process per stage isolates model memory and peak RSS
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                try:
+                    stats = executor.submit(run_stage, stage, config).result()
+                except Exception as e:
+                    stats = {"error": str(e)}
+            results["stages"][stage] = stats
+            if "error" in stats:
+                print(f"  {stage} failed: {stats['error']}")
+            else:
+                throughput = "n/a" if stats["throughput"] is None else f"{stats['throughput']:.2f}"
+                print(f"  p50 {stats['p50_s']:.3f}s  p95 {stats['p95_s']:.3f}s  "
+                      f"{throughput} {stats['throughput_unit']}  "
+                      f"peak RSS {stats['peak_rss_mb']:.0f} MB")
+
+        if args.compare_backends:
+            print("Comparing int8 against fp32...", flush=True)
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                try:
+                    results["backend_comparison"] = executor.submit(compare_backends, config).result()
+                except Exception as e:
+                    results["backend_comparison"] = {"error": str(e)}
+            for name, comparison in results["backend_comparison"].items():
+                if name == "error":
+                    print(f"  comparison failed: {comparison}")
+                    continue
+                agreement = {key: value for key, value in comparison.items()
+                             if key not in ("fp32_s", "int8_s", "speedup")}
+                print(f"  {name:<18} {comparison['speedup']:.2f}x faster  "
+                      + "  ".join(f"{key} {value:.3f}" for key, value in agreement.items()))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    failed = any("error" in stats for stats in results["stages"].values())
+    failed = failed or "error" in results.get("backend_comparison", {})
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        if compare_with_baseline(results, baseline, args.regression_threshold):
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
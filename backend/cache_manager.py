@@ -1,7 +1,11 @@
 import os
 import json
 import hashlib
-from typing import Dict, Optional
+import tempfile
+import threading
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional
+from metrics import record_cache_lookup
 
 class CacheManager:
     def __init__(self, cache_dir: str = "cache"):
@@ -9,6 +13,15 @@ class CacheManager:
         self.cache_index_file = os.path.join(cache_dir, "cache_index.json")
         self.ensure_cache_dir()
         self.cache_index = self.load_cache_index()
+        # file path -> (mtime, size, hash), so unchanged uploads are not re-hashed
+        self.file_hashes = {}
+        # file hash -> byte offsets of fields and segments inside its cache file,
+        # checked against the file on every read since other workers may rewrite it
+        self.result_indexes = {}
+        # file hash -> lock serialising rewrites of its cache file with span reads
+        # within this process
+        self.hash_locks = {}
+        self.hash_locks_guard = threading.Lock()
 
     def ensure_cache_dir(self):
         """Create cache directory if it doesn't exist"""
@@ -23,8 +36,8 @@ class CacheManager:
 
     def save_cache_index(self):
         """Save the cache index to file"""
-        with open(self.cache_index_file, 'w') as f:
-            json.dump(self.cache_index, f, indent=2)
+        body = json.dumps(self.cache_index, indent=2).encode()
+        self.replace_file(self.cache_index_file, lambda f: f.write(body))
 
     def calculate_file_hash(self, file_path: str) -> str:
         """Calculate SHA-256 hash of a file"""
@@ -34,27 +47,257 @@ class CacheManager:
                 sha256_hash.update(byte_block)
         return sha256_hash.hexdigest()
 
-    def get_cached_result(self, file_path: str) -> Optional[Dict]:
-        """Get cached result for a file if it exists"""
+    def get_file_hash(self, file_path: str) -> str:
+        """Hash of a file, recalculated only when its size or modification time changes"""
+        stat = os.stat(file_path)
+        memo = self.file_hashes.get(file_path)
+        if memo and memo[0] == stat.st_mtime and memo[1] == stat.st_size:
+            return memo[2]
         file_hash = self.calculate_file_hash(file_path)
+        self.file_hashes[file_path] = (stat.st_mtime, stat.st_size, file_hash)
+        return file_hash
+
+    def get_hash_lock(self, file_hash: str) -> threading.Lock:
+        """Lock guarding the cache and index files of one hash"""
+        with self.hash_locks_guard:
+            return self.hash_locks.setdefault(file_hash, threading.Lock())
+
+    def get_cache_file_path(self, file_path: str) -> Optional[str]:
+        """Path of the cached result for a file, or None if it is not cached"""
+        file_hash = self.get_file_hash(file_path)
         if file_hash in self.cache_index:
-            cache_entry = self.cache_index[file_hash]
             cache_file_path = os.path.join(self.cache_dir, f"{file_hash}.json")
-            
             if os.path.exists(cache_file_path):
-                with open(cache_file_path, 'r') as f:
-                    return json.load(f)
+                return cache_file_path
+        return None
+
+    def get_cached_result(self, file_path: str) -> Optional[Dict]:
+        """Get cached result for a file if it exists"""
+        cache_file_path = self.get_cache_file_path(file_path)
+        record_cache_lookup("result", hit=cache_file_path is not None)
+        if cache_file_path:
+            with open(cache_file_path, 'r') as f:
+                return json.load(f)
         return None
 
+    def file_signature(self, stat: os.stat_result) -> List[int]:
+        """Identity of one version of a file; a replaced or rewritten file gets a new one"""
+        return [stat.st_ino, stat.st_size, stat.st_mtime_ns]
+
+    def replace_file(self, path: str, write) -> List[int]:
+        """
+        Write a file through a temporary file and atomically move it into place.
+
+        Returns:
+            list: The signature of the written file
+        """
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            # Renaming keeps the inode, size and modification time
+            signature = self.file_signature(os.stat(temp_path))
+            os.replace(temp_path, path)
+            return signature
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def write_indexed_result(self, cache_file_path: str, result: Dict) -> Dict:
+        """
+        Atomically write a result as JSON while recording where each value lands in the file.
+
+        Top-level fields, the transcript's own fields ("transcript.text",
+        "transcript.segments") and every transcript segment get a byte span,
+        so single fields or a time range of segments can be read without
+        parsing the whole file. Segments are indexed sorted by start time, and
+        "source" holds the signature of the written file.
+        """
+        index = {"fields": {}, "segments": []}
+
+        def write_value(f, name, value):
+            start = f.tell()
+            if name == "transcript" and isinstance(value, dict):
+                f.write(b"{")
+                for i, (key, nested) in enumerate(value.items()):
+                    f.write((", " if i else "").encode() + json.dumps(key).encode() + b": ")
+                    write_value(f, f"transcript.{key}", nested)
+                f.write(b"}")
+            elif name == "transcript.segments" and isinstance(value, list):
+                f.write(b"[")
+                for i, segment in enumerate(value):
+                    if i:
+                        f.write(b",\n")
+                    segment_start = f.tell()
+                    f.write(json.dumps(segment).encode())
+                    index["segments"].append([
+                        segment.get("start", 0), segment.get("end", 0),
+                        segment_start, f.tell() - segment_start
+                    ])
+                f.write(b"]")
+            else:
+                f.write(json.dumps(value).encode())
+            index["fields"][name] = [start, f.tell() - start]
+
+        def write_result(f):
+            f.write(b"{")
+            for i, (key, value) in enumerate(result.items()):
+                f.write((",\n  " if i else "\n  ").encode() + json.dumps(key).encode() + b": ")
+                write_value(f, key, value)
+            f.write(b"\n}\n")
+
+        index["source"] = self.replace_file(cache_file_path, write_result)
+
+        index["segments"].sort(key=lambda entry: entry[0])
+        return index
+
+    def write_result_index(self, index_file_path: str, index: Dict):
+        """Atomically write the field/segment index of a cache file"""
+        self.replace_file(index_file_path, lambda f: f.write(json.dumps(index).encode()))
+
+    def load_result_index(self, file_hash: str) -> Dict:
+        """
+        Load the field/segment index of a cache file, building it for older cache files.
+
+        The caller must hold the hash lock and check the index's "source"
+        against the file it opens (see open_indexed_result).
+        """
+        if file_hash in self.result_indexes:
+            return self.result_indexes[file_hash]
+
+        cache_file_path = os.path.join(self.cache_dir, f"{file_hash}.json")
+        index_file_path = os.path.join(self.cache_dir, f"{file_hash}.index.json")
+        index = None
+        if os.path.exists(index_file_path):
+            with open(index_file_path, 'r') as f:
+                index = json.load(f)
+            if index.get("source") != self.file_signature(os.stat(cache_file_path)):
+                index = None
+        if index is None:
+            # Results cached before indexing existed, or whose index belongs to an
+            # older version of the file: rewrite them in indexed form
+            with open(cache_file_path, 'r') as f:
+                result = json.load(f)
+            index = self.write_indexed_result(cache_file_path, result)
+            self.write_result_index(index_file_path, index)
+
+        # Sorted start times and the running maximum of end times, for bisecting
+        index["starts"] = [entry[0] for entry in index["segments"]]
+        max_end = 0
+        index["max_ends"] = []
+        for entry in index["segments"]:
+            max_end = max(max_end, entry[1])
+            index["max_ends"].append(max_end)
+
+        self.result_indexes[file_hash] = index
+        return index
+
+    def open_indexed_result(self, file_hash: str):
+        """
+        Open a cache file together with the index that matches it.
+
+        Another worker may replace the file at any time, so the opened file is
+        checked against the index and the index reloaded if they differ.
+        The caller must hold the hash lock and close the file.
+
+        Returns:
+            tuple: (index, open binary file)
+        """
+        cache_file_path = os.path.join(self.cache_dir, f"{file_hash}.json")
+        for _ in range(3):
+            index = self.load_result_index(file_hash)
+            f = open(cache_file_path, 'rb')
+            if index["source"] == self.file_signature(os.fstat(f.fileno())):
+                return index, f
+            f.close()
+            self.result_indexes.pop(file_hash, None)
+        raise RuntimeError(f"Cache file {cache_file_path} kept changing while it was read")
+
+    def get_cached_fields(self, file_path: str, fields: List[str]) -> Optional[Dict]:
+        """
+        Read only the requested fields of a cached result.
+
+        Fields are top-level keys ("summary", "notes", ...) or transcript keys
+        in dotted form ("transcript.text"); unknown fields are skipped.
+        """
+        cache_file_path = self.get_cache_file_path(file_path)
+        if not cache_file_path:
+            return None
+
+        file_hash = self.get_file_hash(file_path)
+        result = {}
+        with self.get_hash_lock(file_hash):
+            index, f = self.open_indexed_result(file_hash)
+            with f:
+                for field in fields:
+                    span = index["fields"].get(field)
+                    if span is None:
+                        continue
+                    f.seek(span[0])
+                    value = json.loads(f.read(span[1]))
+                    if "." in field:
+                        parent, key = field.split(".", 1)
+                        result.setdefault(parent, {})[key] = value
+                    else:
+                        result[field] = value
+        return result
+
+    def get_cached_segments(self, file_path: str, start: float = None, end: float = None,
+                            offset: int = 0, limit: int = None,
+                            segment_fields: List[str] = None) -> Optional[Dict]:
+        """
+        Read a page of transcript segments overlapping the [start, end] time range.
+
+        Args:
+            file_path (str): Path to the original uploaded file
+            start (float): Only segments ending after this time (seconds)
+            end (float): Only segments starting before this time (seconds)
+            offset (int): Number of matching segments to skip
+            limit (int): Maximum number of segments to return
+            segment_fields (list): Keys to keep from each segment, e.g. start, end, text
+
+        Returns:
+            dict: "items" for the page, "total" matching segments, "offset" and "limit"
+        """
+        cache_file_path = self.get_cache_file_path(file_path)
+        if not cache_file_path:
+            return None
+
+        file_hash = self.get_file_hash(file_path)
+        items = []
+        with self.get_hash_lock(file_hash):
+            index, f = self.open_indexed_result(file_hash)
+            segments = index["segments"]
+            first = bisect_right(index["max_ends"], start) if start is not None else 0
+            last = bisect_left(index["starts"], end) if end is not None else len(segments)
+
+            # max_ends only bounds the range; segments nested inside a long one still need checking
+            matching = [entry for entry in segments[first:last] if start is None or entry[1] > start]
+            page = matching[offset:offset + limit] if limit is not None else matching[offset:]
+
+            with f:
+                for entry in page:
+                    f.seek(entry[2])
+                    segment = json.loads(f.read(entry[3]))
+                    if segment_fields:
+                        segment = {key: segment[key] for key in segment_fields if key in segment}
+                    items.append(segment)
+
+        return {"items": items, "total": len(matching), "offset": offset, "limit": limit}
+
     def cache_result(self, file_path: str, result: Dict):
         """Cache the processing result for a file"""
-        file_hash = self.calculate_file_hash(file_path)
+        file_hash = self.get_file_hash(file_path)
         cache_file_path = os.path.join(self.cache_dir, f"{file_hash}.json")
-        
-        # Save the result
-        with open(cache_file_path, 'w') as f:
-            json.dump(result, f, indent=2)
-        
+        index_file_path = os.path.join(self.cache_dir, f"{file_hash}.index.json")
+
+        # Save the result along with its field and segment index
+        with self.get_hash_lock(file_hash):
+            index = self.write_indexed_result(cache_file_path, result)
+            self.write_result_index(index_file_path, index)
+            self.result_indexes.pop(file_hash, None)
+
         # Update the index
         self.cache_index[file_hash] = {
             "original_file": file_path,
@@ -68,7 +311,7 @@ class CacheManager:
         if not os.path.exists(file_path):
             return False
             
-        file_hash = self.calculate_file_hash(file_path)
+        file_hash = self.get_file_hash(file_path)
         if file_hash not in self.cache_index:
             return False
             
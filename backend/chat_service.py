@@ -4,22 +4,88 @@ from langchain_community.vectorstores import FAISS
 from langchain.memory import ConversationBufferMemory
 from langchain.chains import ConversationalRetrievalChain
 from langchain_community.llms import HuggingFaceHub
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.embeddings import Embeddings
 import os
 from dotenv import load_dotenv
 import json
-import hashlib
+import time
+from metrics import span, observe_stage, model_size_bytes
+from inference import optimize_model
+from model_manager import model_manager
 
 load_dotenv()
 
 os.environ["HUGGINGFACEHUB_API_TOKEN"] = os.getenv("HUGGINGFACEHUB_API_TOKEN")
 
+class StageTimingHandler(BaseCallbackHandler):
+    """Record retrieval and LLM call durations from LangChain callbacks"""
+    def __init__(self):
+        self.start_times = {}
+
+    def _start(self, run_id):
+        self.start_times[run_id] = time.perf_counter()
+
+    def _finish(self, stage, run_id, error=False):
+        start = self.start_times.pop(run_id, None)
+        if start is not None:
+            observe_stage(stage, time.perf_counter() - start, error=error)
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._finish("retrieval", run_id)
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._finish("retrieval", run_id, error=True)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._finish("llm", run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish("llm", run_id, error=True)
+
+def load_instructor_embeddings():
+    """Load the instructor embedding model prepared for the configured inference backend"""
+    # Use a smaller, faster model for embeddings
+    embeddings = HuggingFaceInstructEmbeddings(model_name="hkunlp/instructor-base")
+    optimize_model(embeddings.client)
+    return embeddings
+
+def vectorstore_size_bytes(vectorstore):
+    """Estimate the memory held by a FAISS store's vectors and chunk texts"""
+    vectors = vectorstore.index.ntotal * vectorstore.index.d * 4
+    texts = sum(len(doc.page_content) for doc in vectorstore.docstore._dict.values())
+    return vectors + texts
+
+class ManagedEmbeddings(Embeddings):
+    """Embeddings that borrow the instructor model from the model manager on each call"""
+    def embed_documents(self, texts):
+        with model_manager.use("instructor-base") as embeddings:
+            return embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        with model_manager.use("instructor-base") as embeddings:
+            return embeddings.embed_query(text)
+
 class ChatService:
     def __init__(self):
-        self.text_vectorstores = {}
-        self.text_conversation_chains = {}
-        # Use a smaller, faster model for embeddings
-        self.embeddings = HuggingFaceInstructEmbeddings(model_name="hkunlp/instructor-base")
-        self.embedding_cache = {}
+        # Per-lecture chunks and chat memory; the FAISS stores built from them
+        # are held by the model manager, within its budget, and re-embedded if evicted
+        self.text_chunks = {}
+        self.text_memories = {}
+        model_manager.register(
+            "instructor-base", load_instructor_embeddings,
+            size_fn=lambda embeddings: model_size_bytes(embeddings.client)
+        )
+        self.embeddings = ManagedEmbeddings()
+
+    def vectorstore_name(self, text_id):
+        return f"faiss:{text_id}"
         
     def get_text_chunks(self, text):
         """Split text into chunks for processing"""
@@ -32,27 +98,19 @@ class ChatService:
         chunks = text_splitter.split_text(text)
         return chunks
 
-    def get_cached_embeddings(self, text):
-        """Get cached embeddings or compute and cache new ones"""
-        text_hash = hashlib.sha256(text.encode()).hexdigest()
-        if text_hash in self.embedding_cache:
-            return self.embedding_cache[text_hash]
-        
-        embeddings = self.embeddings.embed_query(text)
-        self.embedding_cache[text_hash] = embeddings
-        return embeddings
-
     def get_vectorstore(self, text_chunks):
-        """Create vector store from text chunks with caching"""
-        # Use cached embeddings for faster vector store creation
-        embeddings = [self.get_cached_embeddings(chunk) for chunk in text_chunks]
+        """Create vector store from text chunks"""
+        # The store is the only copy of the chunk embeddings, so they count
+        # towards the model memory budget and go away when it is evicted
+        with span("embedding"):
+            embeddings = self.embeddings.embed_documents(text_chunks)
         vectorstore = FAISS.from_embeddings(
             text_embeddings=list(zip(text_chunks, embeddings)),
             embedding=self.embeddings
         )
         return vectorstore
 
-    def get_conversation_chain(self, vectorstore):
+    def get_conversation_chain(self, vectorstore, memory=None):
         """Create conversation chain for Q&A with optimized settings"""
         llm = HuggingFaceHub(
             repo_id="google/flan-t5-base",  # Use base model instead of large for faster inference
@@ -63,11 +121,8 @@ class ChatService:
                 "do_sample": True    # Enable sampling for more natural responses
             }
         )
-        memory = ConversationBufferMemory(
-            memory_key='chat_history',
-            return_messages=True,
-            max_token_limit=1000  # Limit memory size
-        )
+        if memory is None:
+            memory = self.get_memory()
         conversation_chain = ConversationalRetrievalChain.from_llm(
             llm=llm,
             retriever=vectorstore.as_retriever(
@@ -78,28 +133,43 @@ class ChatService:
         )
         return conversation_chain
 
+    def get_memory(self):
+        """Create the chat history memory for one text"""
+        return ConversationBufferMemory(
+            memory_key='chat_history',
+            return_messages=True,
+            max_token_limit=1000  # Limit memory size
+        )
+
     def process_text(self, text_id, text):
         """Process new text and create vector store and conversation chain"""
+        name = self.vectorstore_name(text_id)
         try:
             chunks = self.get_text_chunks(text)
-            vectorstore = self.get_vectorstore(chunks)
-            conversation_chain = self.get_conversation_chain(vectorstore)
+            model_manager.register(name, lambda: self.get_vectorstore(chunks), size_fn=vectorstore_size_bytes)
+            # Build the store now so embedding errors surface here
+            with model_manager.use(name):
+                pass
             
-            self.text_vectorstores[text_id] = vectorstore
-            self.text_conversation_chains[text_id] = conversation_chain
+            self.text_chunks[text_id] = chunks
+            self.text_memories[text_id] = self.get_memory()
             
             return {"status": "success", "message": "Text processed successfully"}
         except Exception as e:
+            model_manager.unregister(name)
+            self.text_chunks.pop(text_id, None)
+            self.text_memories.pop(text_id, None)
             return {"error": str(e)}, 500
 
     def ask_question(self, text_id, question):
         """Ask a question about the processed text"""
-        if text_id not in self.text_conversation_chains:
+        if text_id not in self.text_chunks:
             return {"error": "Text not found"}, 404
             
         try:
-            conversation_chain = self.text_conversation_chains[text_id]
-            response = conversation_chain({"question": question})
+            with model_manager.use(self.vectorstore_name(text_id)) as vectorstore:
+                conversation_chain = self.get_conversation_chain(vectorstore, self.text_memories[text_id])
+                response = conversation_chain({"question": question}, callbacks=[StageTimingHandler()])
             
             # Convert messages to serializable format
             chat_history = []
@@ -119,10 +189,11 @@ class ChatService:
     def delete_text(self, text_id):
         """Delete processed text and its associated data"""
         try:
-            if text_id in self.text_vectorstores:
-                del self.text_vectorstores[text_id]
-            if text_id in self.text_conversation_chains:
-                del self.text_conversation_chains[text_id]
+            model_manager.unregister(self.vectorstore_name(text_id))
+            if text_id in self.text_chunks:
+                del self.text_chunks[text_id]
+            if text_id in self.text_memories:
+                del self.text_memories[text_id]
             return {"status": "success", "message": "Text deleted successfully"}
         except Exception as e:
             return {"error": str(e)}, 500
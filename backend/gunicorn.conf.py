@@ -0,0 +1,12 @@
+from prometheus_client import multiprocess
+
+
+def post_fork(server, worker):
+    """Start the memory sampler in each worker, also when the app was preloaded in the master"""
+    from metrics import start_memory_sampler
+    start_memory_sampler()
+
+
+def child_exit(server, worker):
+    """Drop an exited worker's live gauges from the shared Prometheus metrics"""
+    multiprocess.mark_process_dead(worker.pid)
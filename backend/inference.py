@@ -0,0 +1,62 @@
+import logging
+import os
+import torch
+
+logger = logging.getLogger(__name__)
+
+# "fp32" keeps the stock PyTorch models; "int8" applies dynamic quantization to
+# every nn.Linear layer, which is where T5 and the sentence encoders spend their time
+INFERENCE_BACKENDS = ("fp32", "int8")
+
+
+def get_inference_backend() -> str:
+    """Read the inference backend selected through INFERENCE_BACKEND"""
+    backend = os.environ.get("INFERENCE_BACKEND", "fp32").lower()
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(
+            f"Unsupported INFERENCE_BACKEND '{backend}', expected one of {', '.join(INFERENCE_BACKENDS)}"
+        )
+    return backend
+
+
+def configure_torch_threads() -> int:
+    """
+    Pin PyTorch intra-op threads so that all workers together use each core once.
+
+    TORCH_NUM_THREADS wins if set; otherwise the CPU count is divided by the
+    number of worker processes (WEB_CONCURRENCY, as read by gunicorn).
+    """
+    threads = os.environ.get("TORCH_NUM_THREADS")
+    if threads:
+        num_threads = max(1, int(threads))
+    else:
+        workers = max(1, int(os.environ.get("WEB_CONCURRENCY", 1)))
+        num_threads = max(1, (os.cpu_count() or 1) // workers)
+
+    torch.set_num_threads(num_threads)
+    logger.info("Using %d PyTorch intra-op threads", num_threads)
+    return num_threads
+
+
+def optimize_model(model, backend: str = None):
+    """
+    Prepare a PyTorch model for CPU inference with the selected backend.
+
+    Args:
+        model: The model to prepare; it is modified in place
+        backend (str): Backend to use, defaults to INFERENCE_BACKEND
+
+    Returns:
+        The prepared model
+    """
+    backend = backend or get_inference_backend()
+    model.eval()
+    if backend == "int8":
+        torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+        )
+    return model
+
+
+# Configure threading once per process, before any model runs
+torch_threads = configure_torch_threads()
@@ -0,0 +1,175 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    REGISTRY, CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+    generate_latest, multiprocess
+)
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+# Under gunicorn every worker has its own counters. With PROMETHEUS_MULTIPROC_DIR
+# set, workers write their metrics to shared files and a scrape of any worker
+# aggregates all of them (see gunicorn.conf.py for cleaning up exited workers).
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+# How often each worker refreshes its resident memory gauge
+MEMORY_SAMPLE_SECONDS = float(os.environ.get("METRICS_MEMORY_SAMPLE_SECONDS", 15))
+
+# Pipeline stages range from milliseconds (cache lookups) to many minutes (Whisper)
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+
+def current_rss_bytes() -> float:
+    """Current resident set size of this process"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # Fall back to the peak RSS where /proc is unavailable (e.g. macOS, in bytes)
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def model_size_bytes(model) -> int:
+    """Estimate the memory held by a PyTorch model's weights and buffers"""
+    state_dict = getattr(model, "state_dict", None)
+    if state_dict is None:
+        return 0
+
+    # Walk the state dict rather than parameters() so that packed int8 weights
+    # are counted, and skip tensors shared between modules (e.g. tied embeddings)
+    seen = set()
+    total = 0
+    pending = list(state_dict().values())
+    while pending:
+        value = pending.pop()
+        if isinstance(value, (tuple, list)):
+            pending.extend(value)
+            continue
+        if not hasattr(value, "element_size"):
+            continue
+        if value.data_ptr() in seen:
+            continue
+        seen.add(value.data_ptr())
+        total += value.numel() * value.element_size()
+    return total
+
+
+# Pipeline metrics, registered with the default prometheus_client registry
+stage_duration = Histogram(
+    "studybuddy_stage_duration_seconds",
+    "Time spent in each pipeline stage",
+    ["stage"],
+    buckets=DEFAULT_BUCKETS
+)
+stage_errors = Counter(
+    "studybuddy_stage_errors",
+    "Pipeline stage executions that raised an error",
+    ["stage"]
+)
+cache_requests = Counter(
+    "studybuddy_cache_requests",
+    "Cache lookups by cache and result (hit or miss)",
+    ["cache", "result"]
+)
+jobs_in_progress = Gauge(
+    "studybuddy_jobs_in_progress",
+    "Uploads currently being processed",
+    multiprocess_mode="livesum"
+)
+model_memory = Gauge(
+    "studybuddy_model_memory_bytes",
+    "Memory held by loaded model weights, summed over live workers",
+    ["model"],
+    multiprocess_mode="livesum"
+)
+worker_memory = Gauge(
+    "studybuddy_worker_resident_memory_bytes",
+    "Resident memory size of each backend worker, sampled periodically by every worker",
+    multiprocess_mode="liveall"
+)
+
+
+# (process id, thread) of the memory sampler; a forked worker starts its own
+_memory_sampler = (None, None)
+
+
+def update_worker_memory():
+    """Publish this process's resident memory size"""
+    worker_memory.set(current_rss_bytes())
+
+
+def start_memory_sampler(interval: float = MEMORY_SAMPLE_SECONDS):
+    """
+    Refresh the worker memory gauge every `interval` seconds in this process.
+
+    A scrape is served by one worker only, so without this the other workers
+    would report whatever RSS they had when they last served a scrape.
+    """
+    global _memory_sampler
+    pid, thread = _memory_sampler
+    if pid == os.getpid() and thread.is_alive():
+        return
+
+    def sample():
+        while True:
+            update_worker_memory()
+            time.sleep(interval)
+
+    thread = threading.Thread(target=sample, name="worker-memory-sampler", daemon=True)
+    thread.start()
+    _memory_sampler = (os.getpid(), thread)
+
+
+def render() -> bytes:
+    """Render all metrics in Prometheus text format, across workers in multiprocess mode"""
+    update_worker_memory()
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def observe_stage(stage: str, seconds: float, error: bool = False):
+    """Record a finished stage execution"""
+    stage_duration.labels(stage=stage).observe(seconds)
+    if error:
+        stage_errors.labels(stage=stage).inc()
+    logger.debug("Stage %s %s in %.3fs", stage, "failed" if error else "finished", seconds)
+
+
+@contextmanager
+def span(stage: str):
+    """Time the wrapped block as one execution of a pipeline stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        observe_stage(stage, time.perf_counter() - start, error=True)
+        raise
+    observe_stage(stage, time.perf_counter() - start)
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    """Count a cache hit or miss"""
+    cache_requests.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+def set_model_memory(name: str, size: int):
+    """Publish the memory footprint of a loaded model"""
+    model_memory.labels(model=name).set(size)
+
+
+def clear_model_memory(name: str):
+    """Drop the memory series of an unloaded model"""
+    model_memory.labels(model=name).set(0)
+    if not MULTIPROCESS:
+        # Shared multiprocess files cannot drop a series, so it stays at 0 there
+        model_memory.remove(name)
@@ -0,0 +1,282 @@
+import gc
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+from prometheus_client import Counter, Gauge
+
+from metrics import model_size_bytes, set_model_memory, clear_model_memory
+
+logger = logging.getLogger(__name__)
+
+model_budget = Gauge(
+    "studybuddy_model_memory_budget_bytes",
+    "Memory budget shared by all managed models",
+    multiprocess_mode="max"
+)
+model_loads = Counter(
+    "studybuddy_model_loads",
+    "Times a managed model was loaded",
+    ["model"]
+)
+model_evictions = Counter(
+    "studybuddy_model_evictions",
+    "Times an idle managed model was unloaded to stay within the budget",
+    ["model"]
+)
+
+
+# Load times below this are treated as equal when weighing what to evict
+MIN_LOAD_SECONDS = 0.01
+
+
+class ModelManager:
+    """
+    Loads models on demand and keeps their combined footprint within a RAM budget.
+
+    Models are registered with a loader and loaded on first use. When the
+    budget is exceeded, models that are not pinned by an in-flight inference
+    are unloaded, starting with those that free the most memory for the
+    least expected reload cost: large, long idle and quick to load again.
+    A small FAISS store that takes a full re-embed to rebuild therefore
+    outlives a large model that reloads from disk in a few seconds.
+    """
+    def __init__(self, budget_bytes: Optional[int] = None):
+        # A budget of None means unlimited
+        self.budget_bytes = budget_bytes
+        self.loaders: Dict[str, Dict] = {}
+        # name -> {"name", "model", "size", "load_seconds", "last_used", "pins",
+        # "unload_when_idle"}, least recently used first
+        self.loaded: "OrderedDict[str, Dict]" = OrderedDict()
+        # Entries replaced or unregistered while pinned; dropped on their last release
+        self.retired: List[Dict] = []
+        # Last measured size of each model, used to make room before reloading it
+        self.known_sizes: Dict[str, int] = {}
+        # Last measured load time of each model, used to weigh what to evict
+        self.load_seconds: Dict[str, float] = {}
+        self.load_locks: Dict[str, threading.Lock] = {}
+        self.lock = threading.RLock()
+        model_budget.set(budget_bytes or 0)
+
+    def register(self, name: str, loader: Callable, size_fn: Callable = model_size_bytes,
+                 unload_when_idle: bool = False):
+        """
+        Register a model under a name, replacing (and unloading) any previous registration.
+
+        A loaded copy of the previous registration that is still in use keeps
+        serving its current users and is dropped when they release it.
+
+        Args:
+            name (str): Name used to acquire the model
+            loader (callable): Returns a freshly loaded model
+            size_fn (callable): Returns the memory footprint of a loaded model in bytes
+            unload_when_idle (bool): Unload the model as soon as it is no longer in use
+        """
+        with self.lock:
+            self._retire(name)
+            self.loaders[name] = {"loader": loader, "size_fn": size_fn, "unload_when_idle": unload_when_idle}
+            self.known_sizes.pop(name, None)
+            self.load_seconds.pop(name, None)
+        gc.collect()
+
+    def unregister(self, name: str):
+        """Unload a model (once it is no longer in use) and forget its loader"""
+        with self.lock:
+            self._retire(name)
+            self.loaders.pop(name, None)
+            self.known_sizes.pop(name, None)
+            self.load_seconds.pop(name, None)
+            self.load_locks.pop(name, None)
+        gc.collect()
+
+    def used_bytes(self) -> int:
+        with self.lock:
+            return (sum(entry["size"] for entry in self.loaded.values())
+                    + sum(entry["size"] for entry in self.retired))
+
+    def acquire(self, name: str):
+        """Load a model if needed and pin it so it cannot be evicted until released"""
+        return self._acquire(name)["model"]
+
+    def release(self, name: str):
+        """Unpin a model acquired with acquire()"""
+        with self.lock:
+            entry = self.loaded.get(name)
+            if entry is None or entry["pins"] == 0:
+                entry = next((retired for retired in self.retired
+                              if retired["name"] == name and retired["pins"] > 0), None)
+            if entry is None:
+                return
+            self._release(entry)
+
+    @contextmanager
+    def use(self, name: str):
+        """Pin a model for the duration of an inference"""
+        entry = self._acquire(name)
+        try:
+            yield entry["model"]
+        finally:
+            with self.lock:
+                self._release(entry)
+
+    def unload(self, name: str) -> bool:
+        """Drop a loaded model, unless it is pinned"""
+        with self.lock:
+            entry = self.loaded.get(name)
+            if entry is None or entry["pins"] > 0:
+                return False
+            del self.loaded[name]
+            clear_model_memory(name)
+        gc.collect()
+        return True
+
+    def state(self) -> Dict:
+        """Snapshot of the budget and every registered model, for monitoring"""
+        with self.lock:
+            models = []
+            for name, loader in self.loaders.items():
+                entry = self.loaded.get(name)
+                models.append({
+                    "name": name,
+                    "loaded": entry is not None,
+                    "size_bytes": entry["size"] if entry else self.known_sizes.get(name),
+                    "pins": entry["pins"] if entry else 0,
+                    "last_used": entry["last_used"] if entry else None,
+                    "load_seconds": self.load_seconds.get(name),
+                    "unload_when_idle": loader["unload_when_idle"],
+                })
+            return {
+                "budget_bytes": self.budget_bytes,
+                "used_bytes": self.used_bytes(),
+                "retired_bytes": sum(entry["size"] for entry in self.retired),
+                "models": models,
+            }
+
+    def _acquire(self, name: str) -> Dict:
+        """Pin a model, loading it if needed, and return its entry"""
+        with self.lock:
+            if name not in self.loaders:
+                raise KeyError(f"Model '{name}' is not registered")
+            entry = self._pin(name)
+            if entry:
+                return entry
+            load_lock = self.load_locks.setdefault(name, threading.Lock())
+
+        # Load outside the main lock so other models stay usable meanwhile
+        with load_lock:
+            with self.lock:
+                entry = self._pin(name)
+                if entry:
+                    return entry
+                if name not in self.loaders:
+                    raise KeyError(f"Model '{name}' is not registered")
+                self._evict(self.known_sizes.get(name, 0))
+                loader = self.loaders[name]
+
+            start = time.perf_counter()
+            model = loader["loader"]()
+            size = loader["size_fn"](model)
+            load_seconds = time.perf_counter() - start
+            logger.info("Loaded model %s (%.1f MB) in %.2fs", name, size / 2**20, load_seconds)
+
+            with self.lock:
+                entry = {
+                    "name": name, "model": model, "size": size, "load_seconds": load_seconds,
+                    "last_used": time.time(), "pins": 1, "unload_when_idle": loader["unload_when_idle"],
+                }
+                model_loads.labels(model=name).inc()
+                if self.loaders.get(name) is not loader:
+                    # Re-registered or unregistered while loading: serve this caller only
+                    self.retired.append(entry)
+                    return entry
+                self.loaded[name] = entry
+                self.known_sizes[name] = size
+                self.load_seconds[name] = load_seconds
+                set_model_memory(name, size)
+                self._evict(0)
+            return entry
+
+    def _release(self, entry: Dict):
+        """Unpin an entry and drop or evict models that became idle (caller holds the lock)"""
+        entry["pins"] = max(0, entry["pins"] - 1)
+        entry["last_used"] = time.time()
+        if entry["pins"] > 0:
+            return
+        if any(retired is entry for retired in self.retired):
+            self.retired = [retired for retired in self.retired if retired is not entry]
+            if entry["name"] not in self.loaded:
+                clear_model_memory(entry["name"])
+            logger.info("Dropped replaced model %s", entry["name"])
+            gc.collect()
+        elif entry["unload_when_idle"]:
+            self.unload(entry["name"])
+        else:
+            self._evict(0)
+
+    def _retire(self, name: str):
+        """Drop the loaded copy of a model, deferring it until release if pinned (caller holds the lock)"""
+        entry = self.loaded.pop(name, None)
+        if entry is None:
+            return
+        if entry["pins"] > 0:
+            self.retired.append(entry)
+        else:
+            clear_model_memory(name)
+
+    def _pin(self, name: str) -> Optional[Dict]:
+        """Pin an already loaded model and mark it most recently used (caller holds the lock)"""
+        entry = self.loaded.get(name)
+        if entry is None:
+            return None
+        entry["pins"] += 1
+        entry["last_used"] = time.time()
+        self.loaded.move_to_end(name)
+        return entry
+
+    def _eviction_score(self, entry: Dict, now: float) -> float:
+        """
+        How cheap a model is to evict: bytes freed, weighted by how long it has
+        been idle (a rough inverse of the chance it is needed again soon) and
+        divided by the seconds it takes to load it again.
+        """
+        idle_seconds = now - entry["last_used"] + 1.0
+        return entry["size"] * idle_seconds / max(entry["load_seconds"], MIN_LOAD_SECONDS)
+
+    def _evict(self, needed: int):
+        """Unload idle models, cheapest to lose first, until `needed` more bytes fit"""
+        if self.budget_bytes is None:
+            return
+        now = time.time()
+        idle = [name for name, entry in self.loaded.items() if entry["pins"] == 0]
+        # Stable sort, so models that score alike still go least recently used first
+        idle.sort(key=lambda name: self._eviction_score(self.loaded[name], now), reverse=True)
+        for name in idle:
+            if self.used_bytes() + needed <= self.budget_bytes:
+                return
+            logger.info("Evicting idle model %s to stay within the memory budget", name)
+            self.unload(name)
+            model_evictions.labels(model=name).inc()
+        if self.used_bytes() + needed > self.budget_bytes:
+            logger.warning(
+                "Model memory %.1f MB exceeds the %.1f MB budget; remaining models are in use",
+                (self.used_bytes() + needed) / 2**20, self.budget_bytes / 2**20
+            )
+
+
+def whisper_unload_when_idle() -> bool:
+    """Check whether Whisper is unloaded between transcriptions (WHISPER_UNLOAD_WHEN_IDLE, default on)"""
+    return os.environ.get("WHISPER_UNLOAD_WHEN_IDLE", "true").lower() not in ("0", "false", "no")
+
+
+def budget_from_env() -> Optional[int]:
+    """Read MODEL_MEMORY_BUDGET_MB; 0 disables the budget"""
+    budget_mb = float(os.environ.get("MODEL_MEMORY_BUDGET_MB", 2048))
+    return int(budget_mb * 2**20) if budget_mb > 0 else None
+
+
+# Initialize the model manager
+model_manager = ModelManager(budget_from_env())
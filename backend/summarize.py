@@ -1,29 +1,40 @@
+import logging
 import nltk
 from sentence_transformers import SentenceTransformer, util
 from transformers import T5ForConditionalGeneration, T5Tokenizer
+from inference import optimize_model
+from model_manager import model_manager
 
 nltk.download('punkt')
 nltk.download('punkt_tab')
-model = SentenceTransformer('all-MiniLM-L6-v2')
 tokenizer = T5Tokenizer.from_pretrained('t5-small', legacy=False)
-t5_model = T5ForConditionalGeneration.from_pretrained('t5-small')
+# The models themselves are loaded on first use and may be unloaded when idle
+model_manager.register(
+    'all-MiniLM-L6-v2', lambda: optimize_model(SentenceTransformer('all-MiniLM-L6-v2'))
+)
+model_manager.register(
+    't5-small', lambda: optimize_model(T5ForConditionalGeneration.from_pretrained('t5-small'))
+)
+
+logger = logging.getLogger(__name__)
 
 
 def paraphrase(sentence):
     input_text = f"paraphrase: {sentence.strip()}"
     input_ids = tokenizer.encode(input_text, return_tensors="pt", max_length=256, truncation=True)
 
-    outputs = t5_model.generate(
-        input_ids,
-        max_length=128,
-        num_beams=5,
-        early_stopping=True,
-        do_sample=True,
-        temperature=0.5,
-        top_k=40,
-        top_p=0.9,
-        repetition_penalty=1.2
-    )
+    with model_manager.use('t5-small') as t5_model:
+        outputs = t5_model.generate(
+            input_ids,
+            max_length=128,
+            num_beams=5,
+            early_stopping=True,
+            do_sample=True,
+            temperature=0.5,
+            top_k=40,
+            top_p=0.9,
+            repetition_penalty=1.2
+        )
 
     if outputs is None or len(outputs) == 0:
         return sentence
@@ -43,8 +54,9 @@ def generate_summary(title, document, num_sentences=5):
     if len(sentences) == 0:
         return "No valid sentences to summarize."
 
-    title_embedding = model.encode(title, convert_to_tensor=True)
-    sentence_embeddings = model.encode(sentences, convert_to_tensor=True)
+    with model_manager.use('all-MiniLM-L6-v2') as model:
+        title_embedding = model.encode(title, convert_to_tensor=True)
+        sentence_embeddings = model.encode(sentences, convert_to_tensor=True)
 
     similarity_scores = util.pytorch_cos_sim(title_embedding, sentence_embeddings)[0]
 
@@ -55,29 +67,29 @@ def generate_summary(title, document, num_sentences=5):
     )
 
     selected_sentences = [sentence for i, sentence in ranked_sentences[:num_sentences]]
-    paraphrased_sentences = [paraphrase(sentence) for sentence in selected_sentences]
-
-    print("\n=== Paraphrased Sentences ===")
-    for idx, sent in enumerate(paraphrased_sentences, 1):
-        print(f"{idx}. {sent}")
-
-    if paraphrased_sentences:
-        input_text = "summarize: " + " ".join(paraphrased_sentences)
-        input_ids = tokenizer.encode(input_text, return_tensors="pt", max_length=2048, truncation=True)
-
-        outputs = t5_model.generate(
-            input_ids,
-            max_length=1024,
-            num_beams=4,
-            early_stopping=False,
-            do_sample=True
-        )
-        summary = tokenizer.decode(outputs[0], skip_special_tokens=True).strip()
-
-        print("\n=== Generated Summary ===")
-        print(summary)
-    else:
-        summary = "Summary generation failed due to insufficient data."
+    # Keep T5 pinned across all paraphrases and the final summary
+    with model_manager.use('t5-small') as t5_model:
+        paraphrased_sentences = [paraphrase(sentence) for sentence in selected_sentences]
+
+        for idx, sent in enumerate(paraphrased_sentences, 1):
+            logger.debug("Paraphrased sentence %d: %s", idx, sent)
+
+        if paraphrased_sentences:
+            input_text = "summarize: " + " ".join(paraphrased_sentences)
+            input_ids = tokenizer.encode(input_text, return_tensors="pt", max_length=2048, truncation=True)
+
+            outputs = t5_model.generate(
+                input_ids,
+                max_length=1024,
+                num_beams=4,
+                early_stopping=False,
+                do_sample=True
+            )
+            summary = tokenizer.decode(outputs[0], skip_special_tokens=True).strip()
+
+            logger.debug("Generated summary: %s", summary)
+        else:
+            summary = "Summary generation failed due to insufficient data."
 
     return summary
 
@@ -0,0 +1,151 @@
+import gzip
+import json
+import os
+
+import pytest
+from prometheus_client import REGISTRY
+
+from cache_manager import CacheManager
+
+# app reads its keys at import time; tests never download models
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("HUGGINGFACEHUB_API_TOKEN", "test")
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+NUM_SEGMENTS = 600
+
+
+@pytest.fixture(scope="module")
+def app_module(tmp_path_factory):
+    # app creates its upload, output and cache folders in the working directory
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("app"))
+    try:
+        return pytest.importorskip("app")
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture
+def result():
+    segments = [{"start": float(i), "end": float(i + 1), "text": f"sentence {i}"} for i in range(NUM_SEGMENTS)]
+    return {
+        "transcript": {"text": " ".join(segment["text"] for segment in segments), "segments": segments},
+        "summary": "A short summary",
+        "notes": "# Notes\n- point",
+    }
+
+
+@pytest.fixture
+def client(app_module, tmp_path, monkeypatch, result):
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    (uploads / "lecture.mp4").write_bytes(b"not really a video")
+    (uploads / "pending.mp4").write_bytes(b"not processed yet")
+    cache = CacheManager(cache_dir=str(tmp_path / "cache"))
+    cache.cache_result(str(uploads / "lecture.mp4"), result)
+
+    monkeypatch.setattr(app_module, "UPLOAD_FOLDER", str(uploads))
+    monkeypatch.setattr(app_module, "cache_manager", cache)
+    return app_module.app.test_client()
+
+
+def get(client, encoding="identity", **args):
+    return client.get("/upload", query_string={"filename": "lecture.mp4", **args},
+                      headers={"Accept-Encoding": encoding})
+
+
+def test_whole_result_is_streamed_when_not_compressed(client, result):
+    response = get(client)
+    assert response.status_code == 200
+    # send_file streams the cache file instead of building the body in memory
+    assert response.is_streamed
+    assert "Content-Encoding" not in response.headers
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert json.loads(response.get_data()) == result
+
+
+def test_whole_result_is_gzipped(client, result):
+    response = get(client, encoding="gzip")
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert json.loads(gzip.decompress(response.get_data())) == result
+
+
+def test_brotli_is_preferred(client, app_module, result):
+    if app_module.brotli is None:
+        pytest.skip("brotli is not installed")
+    response = get(client, encoding="gzip, br")
+    assert response.headers["Content-Encoding"] == "br"
+    assert json.loads(app_module.brotli.decompress(response.get_data())) == result
+
+
+def test_small_responses_are_not_compressed(client):
+    response = get(client, encoding="gzip", fields="summary")
+    assert "Content-Encoding" not in response.headers
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert response.get_json() == {"summary": "A short summary"}
+
+
+def test_fields_are_projected(client, result):
+    response = get(client, fields="notes,transcript.text")
+    assert response.get_json() == {
+        "notes": "# Notes\n- point",
+        "transcript": {"text": result["transcript"]["text"]},
+    }
+
+
+def test_segments_are_paged_by_default(client, app_module):
+    segments = get(client, fields="segments").get_json()["segments"]
+    assert segments["total"] == NUM_SEGMENTS
+    assert segments["offset"] == 0
+    assert segments["limit"] == app_module.MAX_SEGMENT_PAGE
+    assert len(segments["items"]) == app_module.MAX_SEGMENT_PAGE
+
+    # Larger pages are capped, and the last page holds the remainder
+    segments = get(client, offset=550, limit=1000).get_json()["segments"]
+    assert segments["limit"] == app_module.MAX_SEGMENT_PAGE
+    assert [item["text"] for item in segments["items"]] == [f"sentence {i}" for i in range(550, NUM_SEGMENTS)]
+
+
+def test_segments_in_time_range(client):
+    body = get(client, start="10", end="12.5", segment_fields="start,text").get_json()
+    assert body["segments"]["items"] == [
+        {"start": 10.0, "text": "sentence 10"},
+        {"start": 11.0, "text": "sentence 11"},
+        {"start": 12.0, "text": "sentence 12"},
+    ]
+    assert body["segments"]["total"] == 3
+
+
+@pytest.mark.parametrize("args", [
+    {"start": "abc"},
+    {"end": "nan"},
+    {"start": "inf"},
+    {"offset": "x"},
+    {"limit": "1.5"},
+])
+def test_invalid_range_arguments_are_rejected(client, args):
+    response = get(client, **args)
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "start, end, offset and limit must be numbers"}
+
+
+def test_missing_and_unprocessed_files(client):
+    assert client.get("/upload").status_code == 400
+    assert get(client, filename="missing.mp4").status_code == 404
+    response = get(client, filename="pending.mp4")
+    assert response.status_code == 404
+    assert response.get_json() == {"error": "No processed data found"}
+
+
+def test_each_request_records_one_cache_lookup(client):
+    def lookups(result):
+        return REGISTRY.get_sample_value("studybuddy_cache_requests_total", {"cache": "result", "result": result}) or 0
+
+    hits, misses = lookups("hit"), lookups("miss")
+    get(client, fields="summary,segments", start="1", end="3")
+    get(client, filename="pending.mp4")
+    assert lookups("hit") == hits + 1
+    assert lookups("miss") == misses + 1
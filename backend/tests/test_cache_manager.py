@@ -0,0 +1,165 @@
+import json
+import os
+
+import pytest
+
+from cache_manager import CacheManager
+
+
+def make_result():
+    segments = [
+        {"start": 0.0, "end": 4.0, "text": "intro"},
+        {"start": 4.0, "end": 30.0, "text": "long explanation"},
+        {"start": 5.0, "end": 6.0, "text": "aside"},
+        {"start": 30.0, "end": 35.0, "text": "example"},
+        {"start": 35.0, "end": 40.0, "text": "recap"},
+    ]
+    return {
+        "transcript": {"text": "intro long explanation aside example recap", "segments": segments},
+        "summary": "A short summary",
+        "notes": "# Notes\n- point",
+        "vad": {"removed_duration": 1.5},
+    }
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CacheManager(cache_dir=str(tmp_path / "cache"))
+
+
+@pytest.fixture
+def upload(tmp_path):
+    path = tmp_path / "lecture.mp4"
+    path.write_bytes(b"not really a video")
+    return str(path)
+
+
+def test_indexed_result_round_trips(cache, upload):
+    result = make_result()
+    cache.cache_result(upload, result)
+
+    assert cache.get_cached_result(upload) == result
+    file_hash = cache.get_file_hash(upload)
+    assert os.path.exists(os.path.join(cache.cache_dir, f"{file_hash}.index.json"))
+    # Only the cache index, the result and its byte index remain; no temporary files
+    assert sorted(os.listdir(cache.cache_dir)) == sorted(
+        ["cache_index.json", f"{file_hash}.json", f"{file_hash}.index.json"]
+    )
+
+
+def test_cached_fields_are_read_by_span(cache, upload):
+    cache.cache_result(upload, make_result())
+
+    fields = cache.get_cached_fields(upload, ["summary", "transcript.text", "vad", "missing"])
+    assert fields == {
+        "summary": "A short summary",
+        "transcript": {"text": "intro long explanation aside example recap"},
+        "vad": {"removed_duration": 1.5},
+    }
+
+
+def test_uncached_file_has_no_result(cache, upload):
+    assert cache.get_cache_file_path(upload) is None
+    assert cache.get_cached_result(upload) is None
+    assert cache.get_cached_fields(upload, ["summary"]) is None
+    assert cache.get_cached_segments(upload) is None
+
+
+def test_legacy_cache_file_is_migrated(cache, upload):
+    result = make_result()
+    file_hash = cache.get_file_hash(upload)
+    cache_file_path = os.path.join(cache.cache_dir, f"{file_hash}.json")
+    with open(cache_file_path, "w") as f:
+        json.dump(result, f, indent=2)
+    cache.cache_index[file_hash] = {
+        "original_file": upload,
+        "cache_file": cache_file_path,
+        "timestamp": os.path.getmtime(upload),
+    }
+    cache.save_cache_index()
+
+    assert cache.get_cached_fields(upload, ["notes"]) == {"notes": "# Notes\n- point"}
+    assert os.path.exists(os.path.join(cache.cache_dir, f"{file_hash}.index.json"))
+    assert cache.get_cached_result(upload) == result
+
+    # A fresh manager reads the sidecar index instead of migrating again
+    reloaded = CacheManager(cache_dir=cache.cache_dir)
+    page = reloaded.get_cached_segments(upload, start=29, end=31)
+    assert [segment["text"] for segment in page["items"]] == ["long explanation", "example"]
+
+
+def test_segments_in_time_range(cache, upload):
+    cache.cache_result(upload, make_result())
+
+    page = cache.get_cached_segments(upload, start=5.5, end=30.0)
+    # The long segment overlaps the range even though it starts before it, and a
+    # segment nested inside it is still checked against the start time
+    assert [segment["text"] for segment in page["items"]] == ["long explanation", "aside"]
+    assert page["total"] == 2
+
+    page = cache.get_cached_segments(upload, start=6.0)
+    assert [segment["text"] for segment in page["items"]] == ["long explanation", "example", "recap"]
+
+    assert cache.get_cached_segments(upload, start=40.0)["items"] == []
+
+
+def test_segments_are_paged(cache, upload):
+    cache.cache_result(upload, make_result())
+
+    page = cache.get_cached_segments(upload, offset=1, limit=2, segment_fields=["text"])
+    assert page["items"] == [{"text": "long explanation"}, {"text": "aside"}]
+    assert page["total"] == 5
+    assert page["offset"] == 1
+    assert page["limit"] == 2
+
+    assert cache.get_cached_segments(upload, offset=4)["items"] == [
+        {"start": 35.0, "end": 40.0, "text": "recap"}
+    ]
+
+
+def test_recaching_replaces_the_index(cache, upload):
+    cache.cache_result(upload, make_result())
+    assert cache.get_cached_segments(upload)["total"] == 5
+
+    result = make_result()
+    result["transcript"]["segments"] = result["transcript"]["segments"][:1]
+    cache.cache_result(upload, result)
+    page = cache.get_cached_segments(upload)
+    assert page["total"] == 1
+    assert page["items"] == [{"start": 0.0, "end": 4.0, "text": "intro"}]
+
+
+def test_result_rewritten_by_another_worker_is_reindexed(cache, upload):
+    cache.cache_result(upload, make_result())
+    other = CacheManager(cache_dir=cache.cache_dir)
+    assert other.get_cached_fields(upload, ["summary"]) == {"summary": "A short summary"}
+    assert other.get_cached_segments(upload)["total"] == 5
+
+    # Another worker re-caches the same hash; the first one's memoised offsets are stale
+    result = make_result()
+    result["summary"] = "A much longer summary that moves every later byte offset"
+    result["transcript"]["segments"] = result["transcript"]["segments"][3:]
+    cache.cache_result(upload, result)
+
+    assert other.get_cached_fields(upload, ["summary", "notes"]) == {
+        "summary": result["summary"],
+        "notes": "# Notes\n- point",
+    }
+    assert [segment["text"] for segment in other.get_cached_segments(upload)["items"]] == ["example", "recap"]
+
+
+def test_index_of_an_older_file_version_is_rebuilt(cache, upload):
+    cache.cache_result(upload, make_result())
+    file_hash = cache.get_file_hash(upload)
+    index_file_path = os.path.join(cache.cache_dir, f"{file_hash}.index.json")
+    with open(index_file_path) as f:
+        index = json.load(f)
+    # An index from before signatures were recorded, or for a replaced file
+    del index["source"]
+    with open(index_file_path, "w") as f:
+        json.dump(index, f)
+
+    reloaded = CacheManager(cache_dir=cache.cache_dir)
+    assert reloaded.get_cached_fields(upload, ["notes"]) == {"notes": "# Notes\n- point"}
+    with open(index_file_path) as f:
+        assert "source" in json.load(f)
@@ -0,0 +1,62 @@
+import time
+
+import pytest
+from prometheus_client import REGISTRY
+
+import metrics
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_span_records_duration():
+    before = sample("studybuddy_stage_duration_seconds_count", stage="test_ok")
+    with metrics.span("test_ok"):
+        pass
+    assert sample("studybuddy_stage_duration_seconds_count", stage="test_ok") == before + 1
+    assert sample("studybuddy_stage_errors_total", stage="test_ok") == 0
+
+
+def test_span_counts_errors_and_reraises():
+    with pytest.raises(ValueError):
+        with metrics.span("test_error"):
+            raise ValueError("boom")
+    assert sample("studybuddy_stage_duration_seconds_count", stage="test_error") == 1
+    assert sample("studybuddy_stage_errors_total", stage="test_error") == 1
+
+
+def test_record_cache_lookup():
+    before = sample("studybuddy_cache_requests_total", cache="test", result="hit")
+    metrics.record_cache_lookup("test", hit=True)
+    metrics.record_cache_lookup("test", hit=False)
+    assert sample("studybuddy_cache_requests_total", cache="test", result="hit") == before + 1
+    assert sample("studybuddy_cache_requests_total", cache="test", result="miss") >= 1
+
+
+def test_model_memory_set_and_cleared():
+    metrics.set_model_memory("test-model", 1234)
+    assert sample("studybuddy_model_memory_bytes", model="test-model") == 1234
+    metrics.clear_model_memory("test-model")
+    assert REGISTRY.get_sample_value("studybuddy_model_memory_bytes", {"model": "test-model"}) is None
+
+
+def test_render_prometheus_text():
+    with metrics.span("test_render"):
+        pass
+    text = metrics.render().decode()
+    assert "# TYPE studybuddy_stage_duration_seconds histogram" in text
+    assert 'studybuddy_stage_duration_seconds_bucket{le="+Inf",stage="test_render"} 1.0' in text
+    assert "studybuddy_worker_resident_memory_bytes" in text
+    assert metrics.CONTENT_TYPE.startswith("text/plain")
+
+
+def test_memory_sampler_refreshes_worker_memory(monkeypatch):
+    # Start a fast sampler even if importing app already started the default one
+    monkeypatch.setattr(metrics, "_memory_sampler", (None, None))
+    metrics.worker_memory.set(0)
+    metrics.start_memory_sampler(interval=0.01)
+    deadline = time.time() + 2
+    while sample("studybuddy_worker_resident_memory_bytes") == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    assert sample("studybuddy_worker_resident_memory_bytes") > 0
@@ -0,0 +1,167 @@
+import time
+
+import pytest
+
+from model_manager import ModelManager, whisper_unload_when_idle
+
+
+class FakeModel:
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+
+
+def register(manager, name, size, loads=None, load_seconds=0.0, **kwargs):
+    """Register a fake model of a fixed size, counting how often it is loaded"""
+    def loader():
+        if loads is not None:
+            loads.append(name)
+        time.sleep(load_seconds)
+        return FakeModel(name, size)
+    manager.register(name, loader, size_fn=lambda model: model.size, **kwargs)
+
+
+def test_least_recently_used_model_is_evicted():
+    manager = ModelManager(budget_bytes=250)
+    for name in ("a", "b", "c"):
+        register(manager, name, 100)
+
+    with manager.use("a"):
+        pass
+    with manager.use("b"):
+        pass
+    with manager.use("a"):
+        pass
+    with manager.use("c"):
+        pass
+
+    assert list(manager.loaded) == ["a", "c"]
+    assert manager.used_bytes() == 200
+
+
+def test_large_quick_to_reload_model_is_evicted_before_a_costly_store():
+    manager = ModelManager(budget_bytes=200)
+    # A small store that takes a (re-)embedding to rebuild, and a large model that loads fast
+    register(manager, "faiss:lecture", 10, load_seconds=0.2)
+    register(manager, "t5-small", 100)
+    register(manager, "instructor-base", 100)
+
+    with manager.use("faiss:lecture"):
+        pass
+    with manager.use("t5-small"):
+        pass
+    with manager.use("instructor-base"):
+        pass
+
+    # Least recently used would have dropped the store, which alone frees enough
+    assert list(manager.loaded) == ["faiss:lecture", "instructor-base"]
+    assert manager.state()["models"][0]["load_seconds"] >= 0.2
+
+
+def test_whisper_unload_when_idle_setting(monkeypatch):
+    monkeypatch.delenv("WHISPER_UNLOAD_WHEN_IDLE", raising=False)
+    assert whisper_unload_when_idle()
+    monkeypatch.setenv("WHISPER_UNLOAD_WHEN_IDLE", "false")
+    assert not whisper_unload_when_idle()
+    # The memory budget no longer changes this
+    monkeypatch.setenv("MODEL_MEMORY_BUDGET_MB", "2048")
+    assert not whisper_unload_when_idle()
+
+
+def test_pinned_model_is_not_evicted():
+    manager = ModelManager(budget_bytes=150)
+    register(manager, "a", 100)
+    register(manager, "b", 100)
+
+    with manager.use("a") as a:
+        with manager.use("b"):
+            # Both are in use, so the budget is exceeded rather than unloading "a"
+            assert manager.used_bytes() == 200
+        assert a.name == "a"
+        assert manager.unload("a") is False
+
+
+def test_release_evicts_once_models_are_idle():
+    manager = ModelManager(budget_bytes=150)
+    register(manager, "a", 100)
+    register(manager, "b", 100)
+
+    with manager.use("a"):
+        with manager.use("b"):
+            pass
+        # "b" was released while "a" was still pinned, so "b" had to go
+        assert list(manager.loaded) == ["a"]
+
+    # Room for a model that was loaded before is made ahead of reloading it
+    model = manager.acquire("b")
+    assert list(manager.loaded) == ["b"]
+    manager.release("b")
+    assert model.name == "b"
+    assert manager.used_bytes() == 100
+
+
+def test_reregistering_while_pinned_keeps_serving_the_old_model():
+    manager = ModelManager()
+    loads = []
+    register(manager, "store", 100, loads)
+
+    with manager.use("store") as old:
+        register(manager, "store", 300, loads)
+        assert old.size == 100
+        assert manager.used_bytes() == 100
+        with manager.use("store") as new:
+            assert new.size == 300
+            assert manager.used_bytes() == 400
+
+    # The replaced copy is dropped on its last release
+    assert manager.retired == []
+    assert manager.used_bytes() == 300
+    assert loads == ["store", "store"]
+
+
+def test_unregistering_while_pinned_drops_the_model_on_release():
+    manager = ModelManager()
+    register(manager, "store", 100)
+
+    model = manager.acquire("store")
+    manager.unregister("store")
+    assert manager.used_bytes() == 100
+    manager.release("store")
+    assert manager.used_bytes() == 0
+    assert model.name == "store"
+
+    with pytest.raises(KeyError):
+        manager.acquire("store")
+
+
+def test_unload_when_idle():
+    manager = ModelManager()
+    loads = []
+    register(manager, "whisper", 100, loads, unload_when_idle=True)
+    register(manager, "encoder", 50, loads)
+
+    with manager.use("whisper"):
+        assert manager.used_bytes() == 100
+    with manager.use("whisper"):
+        pass
+    with manager.use("encoder"):
+        pass
+
+    assert list(manager.loaded) == ["encoder"]
+    assert loads == ["whisper", "whisper", "encoder"]
+
+
+def test_state_reports_every_registered_model():
+    manager = ModelManager(budget_bytes=1000)
+    register(manager, "a", 100)
+    register(manager, "b", 200, unload_when_idle=True)
+
+    with manager.use("a"):
+        state = manager.state()
+
+    assert state["budget_bytes"] == 1000
+    assert state["used_bytes"] == 100
+    models = {model["name"]: model for model in state["models"]}
+    assert models["a"]["loaded"] and models["a"]["pins"] == 1 and models["a"]["size_bytes"] == 100
+    assert not models["b"]["loaded"] and models["b"]["size_bytes"] is None
+    assert models["b"]["unload_when_idle"]
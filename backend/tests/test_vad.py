@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+import vad
+
+FRAME = vad.FRAME_SECONDS
+
+
+def energies(levels):
+    """Frame energies (dBFS) from a list of (level_db, seconds) pieces"""
+    return np.concatenate([np.full(int(round(seconds / FRAME)), level) for level, seconds in levels])
+
+
+def noise(level_db, seconds, rng):
+    """Noise-like 'speech' at a given RMS level"""
+    samples = rng.standard_normal(int(seconds * vad.SAMPLE_RATE)).astype(np.float32)
+    return samples * 10 ** (level_db / 20)
+
+
+def test_long_silences_are_removed():
+    regions = vad.find_speech_regions(energies([(-20, 6), (-80, 4), (-20, 6)]), FRAME)
+    assert len(regions) == 2
+    assert regions[0][0] == 0.0
+    assert abs(regions[0][1] - (6 + vad.PADDING_SECONDS)) < 0.05
+    assert abs(regions[1][0] - (10 - vad.PADDING_SECONDS)) < 0.05
+
+
+def test_short_pauses_are_kept():
+    regions = vad.find_speech_regions(energies([(-20, 3), (-80, 0.5), (-20, 3)]), FRAME)
+    assert len(regions) == 1
+
+
+def test_all_silence_has_no_regions():
+    assert vad.find_speech_regions(energies([(-90, 5)]), FRAME) == []
+    assert vad.find_speech_regions(np.array([]), FRAME) == []
+
+
+@pytest.mark.parametrize("room_db, speech_db", [(-40, -15), (-45, -20), (-30, -10)])
+def test_noisy_room_between_speech_is_removed(room_db, speech_db):
+    """Fluctuating room tone well below the speech level is silence, even above the absolute threshold"""
+    rng = np.random.default_rng(1)
+    frame_length = int(vad.SAMPLE_RATE * FRAME)
+    audio = np.concatenate([noise(speech_db, 6, rng), noise(room_db, 4, rng)] * 2 + [noise(speech_db, 6, rng)])
+
+    regions = vad.find_speech_regions(vad.frame_energies_db(audio, frame_length), frame_length / vad.SAMPLE_RATE)
+    kept = sum(end - start for start, end in regions)
+    assert len(regions) == 3
+    # 18s of speech plus the padding around the two cuts
+    assert 18 <= kept <= 18 + 4 * vad.PADDING_SECONDS + 0.1
+
+
+def test_continuous_speech_with_varying_loudness_is_kept():
+    """A soft passage in continuous speech is far above the absolute threshold and must stay"""
+    rng = np.random.default_rng(0)
+    frame_length = int(vad.SAMPLE_RATE * FRAME)
+    pieces = []
+    for _ in range(6):
+        pieces += [noise(-10, 17, rng), noise(-28, 3, rng)]
+    audio = np.concatenate(pieces)
+
+    regions = vad.find_speech_regions(vad.frame_energies_db(audio, frame_length), frame_length / vad.SAMPLE_RATE)
+    kept = sum(end - start for start, end in regions)
+    assert len(regions) == 1
+    assert kept >= 119.9
+
+
+def test_to_original_time_maps_across_cuts():
+    # Kept 0-6s and 10-16s of the original, concatenated to 12s of speech
+    offsets = [[0.0, 0.0, 6.0], [6.0, 10.0, 6.0]]
+    assert vad.to_original_time(offsets, 3.0) == 3.0
+    assert vad.to_original_time(offsets, 7.5) == 11.5
+    # A boundary time starts the later region, or ends the earlier one
+    assert vad.to_original_time(offsets, 6.0) == 10.0
+    assert vad.to_original_time(offsets, 6.0, is_end=True) == 6.0
+    assert vad.to_original_time([], 4.2) == 4.2
+
+
+def test_remap_segments_shifts_segments_and_words():
+    offsets = [[0.0, 0.0, 6.0], [6.0, 10.0, 6.0]]
+    segments = [
+        {"start": 0.0, "end": 6.0, "words": [{"start": 5.0, "end": 6.0}]},
+        {"start": 6.0, "end": 9.0, "words": [{"start": 6.0, "end": 6.5}]},
+    ]
+    vad.remap_segments(segments, offsets)
+    assert (segments[0]["start"], segments[0]["end"]) == (0.0, 6.0)
+    assert segments[0]["words"][0] == {"start": 5.0, "end": 6.0}
+    assert (segments[1]["start"], segments[1]["end"]) == (10.0, 13.0)
+    assert segments[1]["words"][0] == {"start": 10.0, "end": 10.5}
@@ -0,0 +1,175 @@
+import logging
+import os
+from bisect import bisect_left, bisect_right
+from typing import Dict, List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Whisper resamples everything to 16 kHz
+SAMPLE_RATE = 16000
+FRAME_SECONDS = 0.03
+# Frames quieter than this (dBFS) are always treated as silence
+THRESHOLD_DB = float(os.environ.get("VAD_THRESHOLD_DB", -45))
+# Room tone is only recognised when the speech level is at least this far above the
+# noise floor; a smaller spread is quiet speech in a recording without real silence
+MIN_SPEECH_TO_NOISE_DB = 20.0
+# Frames must then be this far above the noise floor to count as speech
+NOISE_MARGIN_DB = 10.0
+# Frame energies are median-filtered over this window so that a noise frame that
+# happens to be loud, or a dip inside a word, does not split a run
+SMOOTHING_SECONDS = 0.15
+# Only silences at least this long are removed, so pauses between sentences are kept
+MIN_SILENCE_SECONDS = float(os.environ.get("VAD_MIN_SILENCE_SECONDS", 1.0))
+# Audio kept on either side of each speech region so word onsets are not clipped
+PADDING_SECONDS = 0.2
+
+
+def vad_enabled() -> bool:
+    """Check whether the silence-stripping pre-pass is enabled (VAD_ENABLED, default on)"""
+    return os.environ.get("VAD_ENABLED", "true").lower() not in ("0", "false", "no")
+
+
+def frame_energies_db(audio: np.ndarray, frame_length: int) -> np.ndarray:
+    """RMS energy of each non-overlapping frame in dBFS"""
+    num_frames = len(audio) // frame_length
+    frames = audio[:num_frames * frame_length].reshape(num_frames, frame_length)
+    # einsum avoids materialising a squared copy of the whole recording
+    rms = np.sqrt(np.einsum('ij,ij->i', frames, frames) / frame_length)
+    return 20 * np.log10(rms + 1e-10)
+
+
+def smooth_energies(energies_db: np.ndarray, window: int) -> np.ndarray:
+    """Running median of the frame energies; unlike a mean it keeps speech/silence edges sharp"""
+    if window <= 1 or len(energies_db) < window:
+        return energies_db
+    half = window // 2
+    padded = np.pad(energies_db, (half, window - 1 - half), mode="edge")
+    return np.median(np.lib.stride_tricks.sliding_window_view(padded, window), axis=1)
+
+
+def find_speech_regions(energies_db: np.ndarray, frame_seconds: float) -> List[List[float]]:
+    """Return [start, end] times (seconds) of the spans that are not long silences"""
+    if len(energies_db) == 0:
+        return []
+
+    energies_db = smooth_energies(energies_db, int(round(SMOOTHING_SECONDS / frame_seconds)))
+    noise_floor = np.percentile(energies_db, 10)
+    speech_level = np.percentile(energies_db, 90)
+    threshold = THRESHOLD_DB
+    if speech_level - noise_floor >= MIN_SPEECH_TO_NOISE_DB:
+        # Room tone: put the threshold a clear margin above it, so its fluctuations
+        # stay below and quiet speech (well above the floor) stays above
+        threshold = max(THRESHOLD_DB, noise_floor + NOISE_MARGIN_DB)
+    silent = energies_db < threshold
+
+    min_silence_frames = max(1, int(round(MIN_SILENCE_SECONDS / frame_seconds)))
+    regions = []
+    speech_start = 0
+    i = 0
+    while i < len(silent):
+        if not silent[i]:
+            i += 1
+            continue
+        run_end = i
+        while run_end < len(silent) and silent[run_end]:
+            run_end += 1
+        if run_end - i >= min_silence_frames:
+            if i > speech_start:
+                regions.append([speech_start * frame_seconds, i * frame_seconds])
+            speech_start = run_end
+        i = run_end
+    if speech_start < len(silent):
+        regions.append([speech_start * frame_seconds, len(silent) * frame_seconds])
+
+    # Pad each region and merge any that now overlap
+    total = len(energies_db) * frame_seconds
+    merged = []
+    for start, end in regions:
+        start = max(0.0, start - PADDING_SECONDS)
+        end = min(total, end + PADDING_SECONDS)
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def strip_silence(audio_path: str) -> Dict:
+    """
+    Decode an audio file and drop long non-speech spans before transcription.
+
+    Args:
+        audio_path (str): Path to the audio file
+
+    Returns:
+        dict: "audio" is the 16 kHz speech-only waveform, "offsets" maps it back
+        to the original recording as [speech_start, original_start, duration]
+        entries (seconds), plus original, speech and removed durations.
+    """
+    import whisper
+
+    audio = whisper.load_audio(audio_path)
+    original_duration = len(audio) / SAMPLE_RATE
+
+    frame_length = int(SAMPLE_RATE * FRAME_SECONDS)
+    regions = find_speech_regions(frame_energies_db(audio, frame_length), frame_length / SAMPLE_RATE)
+
+    if not regions:
+        # Nothing looked like speech; let Whisper see the whole recording
+        regions = [[0.0, original_duration]]
+
+    pieces = []
+    offsets = []
+    speech_position = 0.0
+    for start, end in regions:
+        start_sample = int(start * SAMPLE_RATE)
+        end_sample = len(audio) if end >= original_duration else int(end * SAMPLE_RATE)
+        pieces.append(audio[start_sample:end_sample])
+        duration = (end_sample - start_sample) / SAMPLE_RATE
+        offsets.append([speech_position, start_sample / SAMPLE_RATE, duration])
+        speech_position += duration
+
+    speech_audio = pieces[0] if len(pieces) == 1 else np.concatenate(pieces)
+    speech_duration = len(speech_audio) / SAMPLE_RATE
+    removed_duration = original_duration - speech_duration
+    logger.info(
+        "VAD kept %.1fs of %.1fs (%d regions), removed %.1fs of silence",
+        speech_duration, original_duration, len(offsets), removed_duration
+    )
+
+    return {
+        "audio": speech_audio,
+        "offsets": offsets,
+        "original_duration": round(original_duration, 2),
+        "speech_duration": round(speech_duration, 2),
+        "removed_duration": round(removed_duration, 2),
+    }
+
+
+def to_original_time(offsets: List[List[float]], t: float, is_end: bool = False) -> float:
+    """
+    Map a timestamp in the speech-only audio back to the original recording.
+
+    A time that falls exactly on the boundary between two kept regions is
+    placed at the end of the earlier region when it is an end time, and at
+    the start of the later region otherwise.
+    """
+    if not offsets:
+        return t
+    starts = [offset[0] for offset in offsets]
+    index = (bisect_left(starts, t) if is_end else bisect_right(starts, t)) - 1
+    speech_start, original_start, duration = offsets[max(index, 0)]
+    return round(original_start + min(max(t - speech_start, 0.0), duration), 2)
+
+
+def remap_segments(segments: List[Dict], offsets: List[List[float]]) -> List[Dict]:
+    """Shift Whisper segment and word timestamps back onto the original timeline"""
+    for segment in segments:
+        segment["start"] = to_original_time(offsets, segment["start"])
+        segment["end"] = to_original_time(offsets, segment["end"], is_end=True)
+        for word in segment.get("words", []):
+            word["start"] = to_original_time(offsets, word["start"])
+            word["end"] = to_original_time(offsets, word["end"], is_end=True)
+    return segments